@@ -5,7 +5,9 @@ This package contains the main application components.
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from fastapi.staticfiles import StaticFiles
+import asyncio
 import os
 import logging
 
@@ -14,7 +16,7 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Create FastAPI app
-app = FastAPI(title="Speech-To-Plan Reminder API")
+app = FastAPI(title="Speech-To-Plan Reminder API", default_response_class=ORJSONResponse)
 
 # Configure CORS
 app.add_middleware(
@@ -28,6 +30,7 @@ app.add_middleware(
 # Import routers
 from app.routes.todo_routes import router as todo_router
 from app.routes.transcription_routes import router as transcription_router
+from app.services.audio_service import warmup_whisper
 
 # Include routers
 app.include_router(todo_router)
@@ -48,6 +51,11 @@ static_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "static")
 if os.path.exists(static_dir):
     app.mount("/static", StaticFiles(directory=static_dir), name="static")
 
+@app.on_event("startup")
+async def warmup_model():
+    """Load and warm up Whisper in each worker before it serves requests."""
+    await asyncio.to_thread(warmup_whisper)
+
 @app.get("/")
 async def root():
     """Root endpoint that returns a welcome message."""
@@ -3,7 +3,7 @@ Todo routes for the Speech-To-Plan Reminder application.
 """
 
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional, Dict, Any, Union
 from pydantic import BaseModel
 from datetime import datetime
@@ -35,28 +35,28 @@ class TodoCreate(BaseModel):
     todo: str
     due_date: Optional[str] = None
 
-@router.get("/", response_model=List[TodoResponse])
-async def get_todos(db: Session = Depends(get_db)):
-    """Get all todos."""
-    return get_all_todos(db)
+@router.get("/", response_model=None)
+async def get_todos(db: AsyncSession = Depends(get_db)) -> List[Dict[str, Any]]:
+    """Get all todos, serialized straight from the result rows."""
+    return [row._asdict() for row in await get_all_todos(db)]
 
 @router.post("/", response_model=TodoResponse)
-async def add_todo(todo_data: TodoCreate, db: Session = Depends(get_db)):
+async def add_todo(todo_data: TodoCreate, db: AsyncSession = Depends(get_db)):
     """Create a new todo."""
-    return create_todo(db, todo_data.todo, todo_data.due_date)
+    return await create_todo(db, todo_data.todo, todo_data.due_date)
 
 @router.delete("/{todo_id}")
-async def delete_todo(todo_id: int, db: Session = Depends(get_db)):
+async def delete_todo(todo_id: int, db: AsyncSession = Depends(get_db)):
     """Delete a todo by ID."""
-    result = delete_todo_by_id(db, todo_id)
+    result = await delete_todo_by_id(db, todo_id)
     if not result:
         raise HTTPException(status_code=404, detail="Todo not found")
     return {"success": True}
 
 @router.get("/search/")
-async def search_todo(query: str, db: Session = Depends(get_db)):
+async def search_todo(query: str, db: AsyncSession = Depends(get_db)):
     """Search todos by title."""
-    return search_todos(db, query)
+    return await search_todos(db, query)
 
 # Add a new action endpoint for Node.js server integration
 class ActionRequest(BaseModel):
@@ -64,7 +64,7 @@ class ActionRequest(BaseModel):
     input: Union[Dict[str, Any], int, List[int], str]
 
 @router.post("/action", response_model=Dict[str, Any])
-async def handle_action(action: ActionRequest, db: Session = Depends(get_db)):
+async def handle_action(action: ActionRequest, db: AsyncSession = Depends(get_db)):
     """
     Handle actions forwarded from the Node.js server.
     This endpoint allows the Node.js server to perform database operations.
@@ -75,7 +75,7 @@ async def handle_action(action: ActionRequest, db: Session = Depends(get_db)):
     try:
         if function_name == "getAllTodos":
             # Get all todos
-            todos = get_all_todos(db)
+            todos = await get_all_todos(db)
             
             # Format todos for display
             if todos:
@@ -106,7 +106,7 @@ async def handle_action(action: ActionRequest, db: Session = Depends(get_db)):
             
             # Create the task
             try:
-                todo = create_todo(db, title, due_date)
+                todo = await create_todo(db, title, due_date)
                 return {"response": f"I'll add '{title}' to your tasks."}
             except Exception as e:
                 return {"response": f"Sorry, I encountered an error creating your task: {str(e)}"}
@@ -119,7 +119,7 @@ async def handle_action(action: ActionRequest, db: Session = Depends(get_db)):
                 search_term = str(input_data)
             
             # Use the search term to find matching todos
-            matching_todos = search_todos(db, search_term)
+            matching_todos = await search_todos(db, search_term)
             
             if matching_todos:
                 # Format todos for display with IDs
@@ -132,7 +132,7 @@ async def handle_action(action: ActionRequest, db: Session = Depends(get_db)):
                 # If there's only one match, we can return its ID directly for deletion
                 if len(matching_todos) == 1:
                     # Delete the todo by ID
-                    success = delete_todo_by_id(db, matching_todos[0].id)
+                    success = await delete_todo_by_id(db, matching_todos[0].id)
                     if success:
                         return {"response": f"I've removed '{matching_todos[0].todo}' from your list."}
                     else:
@@ -146,7 +146,7 @@ async def handle_action(action: ActionRequest, db: Session = Depends(get_db)):
             todo_id = input_data
             
             # Delete the todo by ID
-            success = delete_todo_by_id(db, todo_id)
+            success = await delete_todo_by_id(db, todo_id)
             
             if success:
                 return {"response": f"I've removed that task from your list."}
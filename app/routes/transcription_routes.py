@@ -3,18 +3,22 @@ Transcription routes for the Speech-To-Plan Reminder application.
 """
 
 from fastapi import APIRouter, File, UploadFile, Depends, HTTPException
-from fastapi.responses import FileResponse
-from sqlalchemy.orm import Session
+from fastapi.responses import HTMLResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
 from typing import Optional
 import os
-import json
+import logging
+import orjson
 
 from app.models.todo import get_db
-from app.services.audio_service import process_audio_file, save_audio_file, transcribe_audio
+from app.services.audio_service import decode_audio_data, process_audio_bytes, transcribe_audio_async
 from app.services.ai_service import process_chat_message
 from app.config import EXTENSION_DIR
 
+# Configure logging
+logger = logging.getLogger(__name__)
+
 router = APIRouter(tags=["transcription"])
 
 class AudioData(BaseModel):
@@ -32,27 +36,37 @@ class Message(BaseModel):
     """Message model for chat endpoints."""
     text: str
 
+# Read popup.html once; it is static for the lifetime of the server
+try:
+    with open(os.path.join(EXTENSION_DIR, "popup.html"), "rb") as f:
+        POPUP_HTML = f.read()
+except FileNotFoundError:
+    logger.warning(f"popup.html not found in {EXTENSION_DIR}")
+    POPUP_HTML = None
+
 @router.get("/")
 async def root():
     """Serve the main popup.html from extension directory."""
-    return FileResponse(os.path.join(EXTENSION_DIR, "popup.html"))
+    if POPUP_HTML is None:
+        raise HTTPException(status_code=404, detail="popup.html not found")
+    return HTMLResponse(content=POPUP_HTML)
 
 @router.post("/transcribe", response_model=TranscriptionResponse)
 async def transcribe_audio_endpoint(audio_data: AudioData):
     """Transcribe audio using Whisper."""
     try:
-        # Save audio file
-        temp_path = save_audio_file(audio_data.audio)
-        if not temp_path:
-            raise HTTPException(status_code=400, detail="Failed to save audio file")
+        # Decode audio data
+        audio_bytes = decode_audio_data(audio_data.audio)
+        if not audio_bytes:
+            raise HTTPException(status_code=400, detail="Failed to decode audio data")
         
-        # Process audio file
-        audio = process_audio_file(temp_path)
+        # Process audio in memory
+        audio = await process_audio_bytes(audio_bytes)
         if audio is None:
             raise HTTPException(status_code=400, detail="Failed to process audio file")
         
-        # Transcribe audio
-        transcription = transcribe_audio(audio)
+        # Transcribe audio off the event loop
+        transcription = await transcribe_audio_async(audio)
         
         return TranscriptionResponse(
             success=True,
@@ -67,32 +81,27 @@ async def transcribe_audio_endpoint(audio_data: AudioData):
 @router.post("/transcribe_gemini", response_model=TranscriptionResponse)
 async def transcribe_audio_gemini_endpoint(
     audio: UploadFile = File(..., description="The audio file to transcribe"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Transcribe audio using Gemini and process as chat message."""
     try:
-        # Save uploaded file
-        temp_path = f"temp_files/temp_audio_{os.urandom(8).hex()}.mp3"
-        with open(temp_path, "wb") as buffer:
-            buffer.write(await audio.read())
-        
-        # Process audio file
-        processed_audio = process_audio_file(temp_path)
+        # Process uploaded audio in memory
+        processed_audio = await process_audio_bytes(await audio.read())
         if processed_audio is None:
             raise HTTPException(status_code=400, detail="Failed to process audio file")
         
-        # Transcribe audio
-        transcription = transcribe_audio(processed_audio)
+        # Transcribe audio off the event loop
+        transcription = await transcribe_audio_async(processed_audio)
         
         # Process transcription as chat message
         chat_response = await process_chat_message(transcription, db)
         
         # Check if the response is a JSON string and extract the actual message
         try:
-            response_json = json.loads(chat_response)
+            response_json = orjson.loads(chat_response)
             if isinstance(response_json, dict) and "output" in response_json:
                 chat_response = response_json["output"]
-        except (json.JSONDecodeError, TypeError):
+        except (orjson.JSONDecodeError, TypeError):
             # If it's not valid JSON or doesn't have the expected structure, keep as is
             pass
         
@@ -108,17 +117,17 @@ async def transcribe_audio_gemini_endpoint(
         )
 
 @router.post("/chat", response_model=dict)
-async def chat_endpoint(message: Message, db: Session = Depends(get_db)):
+async def chat_endpoint(message: Message, db: AsyncSession = Depends(get_db)):
     """Handle text-based chat messages from the frontend."""
     try:
         response = await process_chat_message(message.text, db)
         
         # Check if the response is a JSON string and extract the actual message
         try:
-            response_json = json.loads(response)
+            response_json = orjson.loads(response)
             if isinstance(response_json, dict) and "output" in response_json:
                 response = response_json["output"]
-        except (json.JSONDecodeError, TypeError):
+        except (orjson.JSONDecodeError, TypeError):
             # If it's not valid JSON or doesn't have the expected structure, keep as is
             pass
             
@@ -1,14 +1,15 @@
 import os
-import json
+import orjson
 import logging
 import re
 from datetime import datetime, timedelta
 from typing import Dict, Any, Optional, List, Tuple
 
 import google.generativeai as genai
-from sqlalchemy.orm import Session
+from cachetools import TTLCache
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.services.todo_service import create_todo, get_all_todos, delete_todo_by_id, check_duplicate_task, search_todos
+from app.services.todo_service import upsert_todo, create_todos_bulk, get_all_todos, delete_todo_by_id, search_todos
 from app.config import GOOGLE_API_KEY, GEMINI_MODEL, SYSTEM_PROMPT
 
 # Configure logging
@@ -23,23 +24,27 @@ if GOOGLE_API_KEY:
 else:
     logger.error("No Gemini API key found")
 
-# Initialize chat
-chat = gemini_model.start_chat(history=[
+# Initial chat history; each message starts a fresh chat from it
+CHAT_HISTORY = [
     {"role": "user", "parts": [SYSTEM_PROMPT]},
-])
+]
+
+# Gemini intents for read-only messages, keyed by normalized message text.
+# Only the intent is cached; todos are still read from the database each time.
+INTENT_CACHE = TTLCache(maxsize=512, ttl=30)
 
 def clean_json_response(response_text: str) -> Dict[str, Any]:
     """Clean and parse JSON response from Gemini."""
     try:
         # If response is already valid JSON, return it
-        return json.loads(response_text)
-    except json.JSONDecodeError:
+        return orjson.loads(response_text)
+    except orjson.JSONDecodeError:
         # Try to extract JSON from markdown code block
         if "```json" in response_text and "```" in response_text:
             json_text = response_text.split("```json")[1].split("```")[0].strip()
             try:
-                return json.loads(json_text)
-            except json.JSONDecodeError:
+                return orjson.loads(json_text)
+            except orjson.JSONDecodeError:
                 logger.error(f"Failed to parse JSON from code block: {json_text}")
         
         # Try to extract any JSON-like structure
@@ -47,8 +52,8 @@ def clean_json_response(response_text: str) -> Dict[str, Any]:
         match = re.search(pattern, response_text, re.DOTALL)
         if match:
             try:
-                return json.loads(match.group(0))
-            except json.JSONDecodeError:
+                return orjson.loads(match.group(0))
+            except orjson.JSONDecodeError:
                 logger.error(f"Failed to parse JSON from pattern match: {match.group(0)}")
         
         logger.error(f"Could not extract valid JSON from response: {response_text}")
@@ -108,17 +113,48 @@ def format_date_with_current_year(date_str: str) -> str:
         logger.error(f"Error formatting date: {str(e)}")
         return date_str  # Return original string if parsing fails
 
-async def process_chat_message(message: str, db: Session) -> str:
+def resolve_due_date(due_date_str: Optional[str]) -> Optional[str]:
+    """
+    Convert a due date from Gemini into an ISO date string.
+    
+    Args:
+        due_date_str: Date string in any format, or None
+        
+    Returns:
+        ISO formatted date using the current year, or None if missing or invalid
+    """
+    if not due_date_str:
+        return None
+    try:
+        # Ensure the date uses the current year
+        formatted_date = format_date_with_current_year(due_date_str)
+        logger.info(f"Formatted date: {formatted_date} (original: {due_date_str})")
+        return datetime.strptime(formatted_date, "%Y-%m-%d").isoformat()
+    except ValueError:
+        logger.error(f"Invalid date format: {due_date_str}")
+        return None
+
+async def process_chat_message(message: str, db: AsyncSession) -> str:
     """Process a chat message and return a response."""
     try:
-        # Send message to Gemini
-        logger.info(f"Sending message to Gemini: {message}")
-        response = chat.send_message(message)
-        response_text = response.text
-        logger.info(f"Raw Gemini response: {response_text}")
-        
-        # Parse the response
-        response_json = clean_json_response(response_text)
+        # Repeated read-only questions reuse Gemini's earlier intent
+        cache_key = " ".join(message.lower().split())
+        response_json = INTENT_CACHE.get(cache_key)
+        if response_json is None:
+            # Send message to Gemini on a request-scoped chat, so concurrent users'
+            # turns stay apart, without blocking the event loop
+            logger.info(f"Sending message to Gemini: {message}")
+            chat = gemini_model.start_chat(history=CHAT_HISTORY)
+            response = await chat.send_message_async(message)
+            response_text = response.text
+            logger.info(f"Raw Gemini response: {response_text}")
+            
+            # Parse the response
+            response_json = clean_json_response(response_text)
+            if response_json.get("function") == "getAllTodos":
+                INTENT_CACHE[cache_key] = response_json
+        else:
+            logger.info(f"Using cached Gemini intent for: {message}")
         
         # Handle direct output responses
         if "type" in response_json and response_json["type"] == "output":
@@ -131,6 +167,30 @@ async def process_chat_message(message: str, db: Session) -> str:
             if function_name == "createTodo":
                 input_data = response_json["input"]
                 
+                if isinstance(input_data, list):
+                    # Several tasks from one message are inserted together
+                    items = []
+                    for item in input_data:
+                        if isinstance(item, dict):
+                            title = item.get("title", "")
+                            due_date = resolve_due_date(item.get("due_date"))
+                        else:
+                            title = str(item)
+                            due_date = None
+                        if title:
+                            items.append((title, due_date))
+                    
+                    logger.info(f"Creating {len(items)} tasks in bulk")
+                    try:
+                        created = await create_todos_bulk(db, items)
+                        if not created:
+                            return "You already have all of those in your tasks."
+                        titles = ", ".join(f"'{title}'" for _, title in created)
+                        return f"I'll add {titles} to your tasks."
+                    except Exception as e:
+                        logger.error(f"Error creating tasks: {str(e)}")
+                        return f"Sorry, I encountered an error creating your tasks: {str(e)}"
+                
                 if isinstance(input_data, dict):
                     title = input_data.get("title", "")
                     due_date_str = input_data.get("due_date")
@@ -140,24 +200,14 @@ async def process_chat_message(message: str, db: Session) -> str:
                     due_date_str = None
                 
                 # Process due date if provided
-                due_date = None
-                if due_date_str:
-                    try:
-                        # Ensure the date uses the current year
-                        formatted_date = format_date_with_current_year(due_date_str)
-                        logger.info(f"Formatted date: {formatted_date} (original: {due_date_str})")
-                        due_date = datetime.strptime(formatted_date, "%Y-%m-%d").isoformat()
-                    except ValueError:
-                        logger.error(f"Invalid date format: {due_date_str}")
-                
-                # Check for duplicate task
-                if check_duplicate_task(db, title, due_date):
-                    return f"You already have '{title}' in your tasks."
+                due_date = resolve_due_date(due_date_str)
                 
-                # Create the task
+                # Create the task; duplicates are rejected by the database
                 logger.info(f"Creating task: '{title}', due: {due_date}")
                 try:
-                    todo = create_todo(db, title, due_date)
+                    todo, created = await upsert_todo(db, title, due_date)
+                    if not created:
+                        return f"You already have '{title}' in your tasks."
                     logger.info(f"Created task: {title}, due: {due_date}, id: {todo.id}")
                     return f"I'll add '{title}' to your tasks."
                 except Exception as e:
@@ -166,7 +216,7 @@ async def process_chat_message(message: str, db: Session) -> str:
             
             elif function_name == "getAllTodos":
                 # Get all todos
-                todos = get_all_todos(db)
+                todos = await get_all_todos(db)
                 
                 # Format todos for display
                 if todos:
@@ -183,7 +233,7 @@ async def process_chat_message(message: str, db: Session) -> str:
                 search_term = response_json["input"].get("title", "")
                 
                 # Use the search term to find matching todos
-                matching_todos = search_todos(db, search_term)
+                matching_todos = await search_todos(db, search_term)
                 
                 if matching_todos:
                     # Format todos for display with IDs
@@ -199,7 +249,7 @@ async def process_chat_message(message: str, db: Session) -> str:
                     # If there's only one match, we can return its ID directly for deletion
                     if len(todo_ids) == 1:
                         # Delete the todo by ID
-                        success = delete_todo_by_id(db, todo_ids[0])
+                        success = await delete_todo_by_id(db, todo_ids[0])
                         if success:
                             return f"I've removed '{matching_todos[0].todo}' from your list."
                         else:
@@ -213,7 +263,7 @@ async def process_chat_message(message: str, db: Session) -> str:
                 todo_id = response_json["input"]
                 
                 # Delete the todo by ID
-                success = delete_todo_by_id(db, todo_id)
+                success = await delete_todo_by_id(db, todo_id)
                 
                 if success:
                     return f"I've removed that task from your list."
@@ -2,79 +2,182 @@
 Audio service for the Speech-To-Plan Reminder application.
 """
 
-import base64
+import io
+import pybase64
 import logging
 import os
+import asyncio
+import threading
+import time
 import numpy as np
+import torch
+import av
 import whisper
+from whisper.audio import mel_filters
+from functools import lru_cache
 from typing import Optional
 
-from app.config import TEMP_DIR, DEVICE, WHISPER_MODEL
+from app.config import DEVICE, WHISPER_MODEL, WHISPER_BACKEND, WHISPER_TRT_CACHE, WHISPER_CONCURRENCY, CPU_THREADS
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
-# Load Whisper model
-logger.info(f"Loading Whisper model on {DEVICE}...")
-model = whisper.load_model(WHISPER_MODEL)
-model.to(DEVICE)
+# Marker that ends the data URL prefix of base64 uploads
+DATA_URL_MARKER = b'base64,'
 
-def save_audio_file(audio_data: str) -> Optional[str]:
+@lru_cache(maxsize=1)
+def get_model():
+    """Load the Whisper model once per process and return the resident copy."""
+    logger.info(f"Loading Whisper model ({WHISPER_BACKEND}) on {DEVICE}...")
+    if WHISPER_BACKEND == "faster-whisper":
+        from faster_whisper import WhisperModel
+        
+        # CTranslate2 backend with int8 weights; on CUDA activations stay in fp16.
+        # Two workers let two requests transcribe concurrently from worker threads.
+        return WhisperModel(
+            WHISPER_MODEL,
+            device=DEVICE,
+            compute_type="int8_float16" if DEVICE == "cuda" else "int8",
+            cpu_threads=CPU_THREADS,
+            num_workers=2
+        )
+    
+    if WHISPER_BACKEND == "tensorrt":
+        from whisper_trt import load_trt_model
+        
+        # WhisperTRT ships English-only engines; the engine is built on first
+        # start and loaded from the cache path afterwards
+        os.makedirs(os.path.dirname(WHISPER_TRT_CACHE), exist_ok=True)
+        return load_trt_model(f"{WHISPER_MODEL}.en", path=WHISPER_TRT_CACHE)
+    
+    model = whisper.load_model(WHISPER_MODEL)
+    model.to(DEVICE)
+    model.eval()
+    
+    # Dynamic int8 quantization of the linear layers speeds up CPU inference.
+    # Whisper's Linear subclass only adds dtype casting for fp16, so it is
+    # swapped for plain nn.Linear, which quantize_dynamic knows how to convert.
+    if DEVICE == "cpu":
+        # Split the cores between worker processes instead of oversubscribing them
+        torch.set_num_threads(CPU_THREADS)
+        for module in model.modules():
+            if isinstance(module, whisper.model.Linear):
+                module.__class__ = torch.nn.Linear
+        model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+        logger.info("Quantized Whisper linear layers to int8")
+    
+    # On CUDA, compile the encoder: its input is always a (batch, n_mels, 3000)
+    # mel, so reduce-overhead mode can replay it as a CUDA graph. The inductor
+    # backend behind torch.compile is not available on Windows.
+    if DEVICE == "cuda" and os.name != "nt":
+        model.encoder = torch.compile(model.encoder, mode="reduce-overhead", fullgraph=True)
+        logger.info("Compiled Whisper encoder")
+    return model
+
+# Silero VAD for the openai and tensorrt backends; faster-whisper has its own VAD filter.
+# The model keeps streaming state between windows, so calls are serialized.
+if WHISPER_BACKEND != "faster-whisper":
+    from silero_vad import load_silero_vad, get_speech_timestamps
+    
+    get_vad_model = lru_cache(maxsize=1)(load_silero_vad)
+    vad_lock = threading.Lock()
+
+def keep_speech(audio: np.ndarray) -> Optional[np.ndarray]:
+    """
+    Keep only the speech regions of audio.
+    
+    Args:
+        audio: 16kHz mono float32 audio
+        
+    Returns:
+        Concatenated speech regions, or None if no speech was detected
+    """
+    with vad_lock:
+        spans = get_speech_timestamps(torch.from_numpy(audio), get_vad_model(), sampling_rate=16000)
+    if not spans:
+        return None
+    if len(spans) == 1:
+        return audio[spans[0]['start']:spans[0]['end']]
+    return np.concatenate([audio[span['start']:span['end']] for span in spans])
+
+def decode_audio_data(audio_data: str) -> Optional[bytes]:
     """
-    Save base64 audio data to a temporary file.
+    Decode base64 audio data.
     
     Args:
-        audio_data: Base64 encoded audio data
+        audio_data: Base64 encoded audio data, optionally with a data URL prefix
         
     Returns:
-        Path to saved audio file or None if error
+        Decoded audio bytes or None if error
     """
     try:
-        # Remove data URL prefix if present
-        if 'base64,' in audio_data:
-            audio_data = audio_data.split('base64,')[1]
+        # Remove data URL prefix if present, slicing a view instead of
+        # copying the payload; the prefix is always near the start
+        buf = audio_data.encode('ascii')
+        prefix_end = buf.find(DATA_URL_MARKER, 0, 256)
+        payload = memoryview(buf)
+        if prefix_end >= 0:
+            payload = payload[prefix_end + len(DATA_URL_MARKER):]
         
         # Decode base64 data
-        audio_bytes = base64.b64decode(audio_data)
-        
-        # Create temporary file
-        os.makedirs(TEMP_DIR, exist_ok=True)
-        temp_path = os.path.join(TEMP_DIR, f'temp_audio_{os.urandom(8).hex()}.mp3')
-        
-        with open(temp_path, 'wb') as f:
-            f.write(audio_bytes)
-        
-        return temp_path
+        return pybase64.b64decode(payload, validate=False)
     except Exception as e:
-        logger.error(f"Error saving audio file: {str(e)}")
+        logger.error(f"Error decoding audio data: {str(e)}")
         return None
 
-def process_audio_file(file_path: str) -> Optional[np.ndarray]:
+def decode_pcm(audio_bytes: bytes) -> np.ndarray:
     """
-    Process audio file and return numpy array.
+    Decode audio in-process with PyAV.
     
     Args:
-        file_path: Path to audio file
+        audio_bytes: Encoded audio (e.g. MP3 or WebM)
         
     Returns:
-        Processed audio as numpy array or None if error
+        16kHz mono float32 samples, as whisper.load_audio would produce
+    """
+    with av.open(io.BytesIO(audio_bytes)) as container:
+        stream = container.streams.audio[0]
+        # libswresample handles the downmix, resampling and sample format at once
+        resampler = av.AudioResampler(format='flt', layout='mono', rate=16000)
+        blocks = [
+            resampled.to_ndarray().reshape(-1)
+            for frame in container.decode(stream)
+            for resampled in resampler.resample(frame)
+        ]
+        # Flush samples buffered inside the resampler
+        blocks.extend(resampled.to_ndarray().reshape(-1) for resampled in resampler.resample(None))
+    return np.concatenate(blocks) if blocks else np.empty(0, dtype=np.float32)
+
+async def process_audio_bytes(audio_bytes: bytes) -> Optional[np.ndarray]:
+    """
+    Decode audio bytes and return numpy array.
+    
+    The bytes are decoded in memory with PyAV on a worker thread, so no
+    subprocess is spawned, no temporary files are written and the event
+    loop is not blocked.
+    
+    Args:
+        audio_bytes: Encoded audio (e.g. MP3 or WebM)
+        
+    Returns:
+        Processed audio as 16kHz mono float32 numpy array or None if error
     """
     try:
-        # Load audio using whisper's load_audio function
-        audio = whisper.load_audio(file_path)
+        audio = await asyncio.to_thread(decode_pcm, audio_bytes)
         
         # Check if audio is valid
         if audio is None or len(audio) == 0:
             logger.error("Audio file is empty or invalid")
             return None
         
-        if not np.isfinite(audio).all():
+        # Any NaN or inf makes the sum non-finite; one reduction, no mask array
+        if not np.isfinite(np.sum(audio, dtype=np.float64)):
             logger.error("Audio contains invalid values")
             return None
         
         return audio
     except Exception as e:
-        logger.error(f"Error processing audio file: {str(e)}")
+        logger.error(f"Error processing audio: {str(e)}")
         return None
 
 def transcribe_audio(audio: np.ndarray) -> str:
@@ -87,11 +190,82 @@ def transcribe_audio(audio: np.ndarray) -> str:
     Returns:
         Transcribed text
     """
+    model = get_model()
     try:
-        # Transcribe audio
-        result = model.transcribe(audio)
+        if WHISPER_BACKEND == "faster-whisper":
+            # Segments are generated lazily; the built-in VAD filter skips silence
+            segments, _ = model.transcribe(audio, beam_size=1, vad_filter=True)
+            return "".join(segment.text for segment in segments).strip()
+        
+        # Skip silent regions, which cost compute and invite hallucinations
+        audio = keep_speech(audio)
+        if audio is None:
+            return ""
+        
+        if WHISPER_BACKEND == "tensorrt":
+            # The engine decodes a single 30-second window per call
+            window = 30 * 16000
+            texts = [model.transcribe(audio[start:start + window])["text"].strip() for start in range(0, len(audio), window)]
+            return " ".join(text for text in texts if text)
+        
+        audio_tensor = torch.from_numpy(audio)
+        if DEVICE == "cuda":
+            # Stage through pinned memory for an asynchronous host-to-device copy
+            pinned = torch.empty(audio_tensor.shape, dtype=audio_tensor.dtype, pin_memory=True)
+            pinned.copy_(audio_tensor)
+            audio_tensor = pinned.to(DEVICE, non_blocking=True)
+        
+        # Transcribe audio without autograd tracking
+        with torch.inference_mode():
+            result = model.transcribe(audio_tensor, fp16=(DEVICE == "cuda"))
         
         return result["text"].strip()
     except Exception as e:
         logger.error(f"Error transcribing audio: {str(e)}")
         raise
+
+# Bounds concurrent transcriptions; created on first use so it binds to the server's loop
+transcription_semaphore: Optional[asyncio.Semaphore] = None
+
+async def transcribe_audio_async(audio: np.ndarray) -> str:
+    """
+    Transcribe audio in a worker thread without blocking the event loop.
+    
+    At most WHISPER_CONCURRENCY transcriptions run at once; further
+    requests wait for a slot instead of oversubscribing the device.
+    
+    Args:
+        audio: Audio data as numpy array
+        
+    Returns:
+        Transcribed text
+    """
+    global transcription_semaphore
+    if transcription_semaphore is None:
+        transcription_semaphore = asyncio.Semaphore(WHISPER_CONCURRENCY)
+    async with transcription_semaphore:
+        return await asyncio.to_thread(transcribe_audio, audio)
+
+def warmup_whisper():
+    """
+    Load the model and run one dummy transcription.
+    
+    VAD is bypassed (it would drop the silence), so kernel selection happens
+    at startup instead of on the first request.
+    """
+    start = time.perf_counter()
+    model = get_model()
+    silence = np.zeros(16000, dtype=np.float32)
+    if WHISPER_BACKEND == "faster-whisper":
+        segments, _ = model.transcribe(silence, beam_size=1)
+        list(segments)
+    elif WHISPER_BACKEND == "tensorrt":
+        get_vad_model()
+        model.transcribe(silence)
+    else:
+        get_vad_model()
+        # Also cache the mel filterbank on DEVICE
+        mel_filters(DEVICE, model.dims.n_mels)
+        with torch.inference_mode():
+            model.transcribe(torch.from_numpy(silence).to(DEVICE), fp16=(DEVICE == "cuda"))
+    logger.info(f"Whisper model warmed up in {time.perf_counter() - start:.2f}s")
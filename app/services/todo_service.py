@@ -2,33 +2,87 @@
 Todo service for the Speech-To-Plan Reminder application.
 """
 
-from sqlalchemy.orm import Session
-from sqlalchemy import or_
-from datetime import datetime
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import Row, or_, select, update, delete, case, literal_column
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from datetime import datetime, timezone
+import asyncio
 import logging
+import sys
 from typing import List, Optional, Union, Tuple
 
-from app.models.todo import Todo
+from app.models.todo import Todo, dedupe_conflict_target
 from calendar_service import create_calendar_event
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
-def get_all_todos(db: Session) -> List[Todo]:
+# datetime.fromisoformat accepts a trailing 'Z' from Python 3.11 on
+if sys.version_info >= (3, 11):
+    _parse_iso = datetime.fromisoformat
+else:
+    def _parse_iso(value: str) -> datetime:
+        """Parse an ISO datetime, accepting a trailing 'Z' for UTC."""
+        return datetime.fromisoformat(value[:-1] + '+00:00' if value.endswith('Z') else value)
+
+async def get_all_todos(db: AsyncSession) -> List[Row]:
     """
     Get all todos from the database.
     
+    Columns are selected directly so no ORM objects are built per row.
+    
     Args:
         db: Database session
         
     Returns:
-        List of Todo objects
+        List of rows with the Todo columns, newest first
     """
-    return db.query(Todo).order_by(Todo.created_at.desc()).all()
+    result = await db.execute(
+        select(
+            Todo.id,
+            Todo.todo,
+            Todo.due_date,
+            Todo.created_at,
+            Todo.updated_at,
+            Todo.calendar_event_id
+        ).order_by(Todo.created_at.desc())
+    )
+    return result.all()
 
-def create_todo(db: Session, title: str, due_date: Optional[str] = None) -> Todo:
+def _parse_due_date(due_date: str) -> datetime:
     """
-    Create a new todo.
+    Parse a due date string.
+    
+    Args:
+        due_date: Due date in ISO format, with or without a time part
+        
+    Returns:
+        Parsed naive datetime; dates with a "Z" or offset are converted to UTC,
+        since due_date is a timestamp without time zone
+        
+    Examples:
+        >>> _parse_due_date("2025-06-01T09:00:00Z")
+        datetime.datetime(2025, 6, 1, 9, 0)
+        >>> _parse_due_date("2025-06-01T09:00:00+02:00")
+        datetime.datetime(2025, 6, 1, 7, 0)
+        >>> _parse_due_date("2025-06-01")
+        datetime.datetime(2025, 6, 1, 0, 0)
+    """
+    if 'T' in due_date:
+        # ISO format with time; asyncpg rejects aware values for naive columns
+        parsed = _parse_iso(due_date)
+        if parsed.tzinfo is not None:
+            parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+        return parsed
+    # Just date (YYYY-MM-DD)
+    return datetime.strptime(due_date, "%Y-%m-%d")
+
+async def upsert_todo(db: AsyncSession, title: str, due_date: Optional[str] = None) -> Tuple[Todo, bool]:
+    """
+    Insert a todo unless an equivalent one already exists.
+    
+    Duplicates are detected by the todos_dedupe_* unique indexes, so the
+    check and the insert happen in a single INSERT ... ON CONFLICT statement.
     
     Args:
         db: Database session
@@ -36,54 +90,132 @@ def create_todo(db: Session, title: str, due_date: Optional[str] = None) -> Todo
         due_date: Optional due date in ISO format
         
     Returns:
-        Created Todo object
+        Tuple of (todo, created) where created is False if the todo already existed
     """
-    calendar_event_id = None
     parsed_due_date = None
-    
     if due_date:
         try:
             # Parse due date
             logger.info(f"Processing due date: {due_date}")
-            
-            # Handle different date formats
-            if 'T' in due_date:
-                # ISO format with time
-                parsed_due_date = datetime.fromisoformat(due_date.replace('Z', '+00:00'))
-            else:
-                # Just date (YYYY-MM-DD)
-                parsed_due_date = datetime.strptime(due_date, "%Y-%m-%d")
-            
+            parsed_due_date = _parse_due_date(due_date)
             logger.info(f"Parsed due date: {parsed_due_date}")
-            
-            # Format date for calendar event (YYYY-MM-DD)
-            calendar_date = parsed_due_date.strftime("%Y-%m-%d")
-            
-            # Create calendar event
-            calendar_event_id = create_calendar_event(title, calendar_date)
-            
-            if calendar_event_id:
-                logger.info(f"Created calendar event with ID: {calendar_event_id}")
-            else:
-                logger.warning("Failed to create calendar event, but will continue with task creation")
-        except Exception as e:
+        except ValueError as e:
             logger.error(f"Error processing due date: {str(e)}")
-            # Continue with task creation even if calendar event creation fails
     
-    # Create todo
-    todo = Todo(
-        todo=title,
-        due_date=parsed_due_date,
-        calendar_event_id=calendar_event_id
+    # xmax is 0 only for rows inserted by this statement
+    insert_stmt = pg_insert(Todo).values(todo=title, due_date=parsed_due_date)
+    stmt = (
+        insert_stmt
+        .on_conflict_do_update(
+            set_={"due_date": insert_stmt.excluded.due_date},
+            **dedupe_conflict_target(parsed_due_date is not None),
+        )
+        .returning(Todo, literal_column("xmax = 0").label("created"))
     )
+    result = await db.execute(stmt, execution_options={"populate_existing": True})
+    todo, created = result.one()
+    await db.commit()
+    
+    if not created:
+        logger.info(f"Duplicate task: '{title}' matches existing task {todo.id}")
+        return todo, False
+    
+    if parsed_due_date:
+        # Create calendar event (YYYY-MM-DD)
+        calendar_event_id = await asyncio.to_thread(
+            create_calendar_event, title, parsed_due_date.strftime("%Y-%m-%d")
+        )
+        
+        if calendar_event_id:
+            logger.info(f"Created calendar event with ID: {calendar_event_id}")
+            todo.calendar_event_id = calendar_event_id
+            await db.commit()
+        else:
+            logger.warning("Failed to create calendar event, but will continue with task creation")
     
-    db.add(todo)
-    db.commit()
-    db.refresh(todo)
+    await db.refresh(todo)
+    return todo, True
+
+async def create_todo(db: AsyncSession, title: str, due_date: Optional[str] = None) -> Todo:
+    """
+    Create a new todo, or return the existing one if it is a duplicate.
     
+    Args:
+        db: Database session
+        title: Todo title
+        due_date: Optional due date in ISO format
+        
+    Returns:
+        Created Todo object
+    """
+    todo, _ = await upsert_todo(db, title, due_date)
     return todo
 
-def delete_todo_by_id(db: Session, todo_id: Union[int, List[int]]) -> bool:
+async def create_todos_bulk(db: AsyncSession, items: List[Tuple[str, Optional[str]]]) -> List[Tuple[int, str]]:
+    """
+    Create several todos at once.
+    
+    All rows are written with a single INSERT, calendar events are created
+    concurrently, and their IDs are stored back with a single UPDATE.
+    Items that duplicate an existing todo are skipped.
+    
+    Args:
+        db: Database session
+        items: List of (title, due_date) tuples, due_date in ISO format or None
+        
+    Returns:
+        List of (id, title) tuples for the todos that were created
+    """
+    if not items:
+        return []
+    
+    rows = []
+    for title, due_date in items:
+        parsed_due_date = None
+        if due_date:
+            try:
+                parsed_due_date = _parse_due_date(due_date)
+            except ValueError as e:
+                logger.error(f"Error processing due date for '{title}': {str(e)}")
+        rows.append({"todo": title, "due_date": parsed_due_date, "calendar_event_id": None})
+    
+    # Insert all todos in one statement, skipping duplicates
+    result = await db.execute(
+        pg_insert(Todo)
+        .values(rows)
+        .on_conflict_do_nothing()
+        .returning(Todo.id, Todo.todo, Todo.due_date)
+    )
+    created = result.all()
+    await db.commit()
+    
+    # Create calendar events for todos with a due date concurrently
+    dated = [row for row in created if row.due_date]
+    if dated:
+        event_ids = await asyncio.gather(*[
+            asyncio.to_thread(create_calendar_event, row.todo, row.due_date.strftime("%Y-%m-%d"))
+            for row in dated
+        ])
+        
+        event_map = {
+            row.id: event_id
+            for row, event_id in zip(dated, event_ids)
+            if event_id
+        }
+        if event_map:
+            # Store all calendar event IDs in one statement
+            await db.execute(
+                update(Todo)
+                .where(Todo.id.in_(list(event_map)))
+                .values(calendar_event_id=case(event_map, value=Todo.id))
+                .execution_options(synchronize_session=False)
+            )
+            await db.commit()
+        logger.info(f"Created {len(event_map)} calendar events for {len(dated)} dated todos")
+    
+    return [(row.id, row.todo) for row in created]
+
+async def delete_todo_by_id(db: AsyncSession, todo_id: Union[int, List[int]]) -> bool:
     """
     Delete a todo by ID.
     
@@ -97,28 +229,27 @@ def delete_todo_by_id(db: Session, todo_id: Union[int, List[int]]) -> bool:
     try:
         if isinstance(todo_id, list):
             # Delete multiple todos
-            todos = db.query(Todo).filter(Todo.id.in_(todo_id)).all()
-            if not todos:
-                return False
-            
-            for todo in todos:
-                db.delete(todo)
+            condition = Todo.id.in_(todo_id)
         else:
             # Delete single todo
-            todo = db.query(Todo).filter(Todo.id == todo_id).first()
-            if not todo:
-                return False
-            
-            db.delete(todo)
+            condition = Todo.id == todo_id
         
-        db.commit()
+        # Delete in one statement instead of loading each row first
+        result = await db.execute(
+            delete(Todo).where(condition).execution_options(synchronize_session=False)
+        )
+        if not result.rowcount:
+            await db.rollback()
+            return False
+        
+        await db.commit()
         return True
     except Exception as e:
         logger.error(f"Error deleting todo: {str(e)}")
-        db.rollback()
+        await db.rollback()
         return False
 
-def search_todos(db: Session, query: str) -> List[Todo]:
+async def search_todos(db: AsyncSession, query: str) -> List[Todo]:
     """
     Search todos by title.
     
@@ -130,114 +261,14 @@ def search_todos(db: Session, query: str) -> List[Todo]:
         List of matching Todo objects
     """
     search_term = f"%{query}%"
-    return db.query(Todo).filter(
+    result = await db.execute(select(Todo).where(
         or_(
             Todo.todo.ilike(search_term)
         )
-    ).all()
-
-def check_duplicate_task(db: Session, title: str, due_date: Optional[str] = None) -> bool:
-    """
-    Check if a task with the same title and due date already exists.
-    
-    Args:
-        db: Database session
-        title: Task title
-        due_date: Optional due date in ISO format
-        
-    Returns:
-        True if a duplicate exists, False otherwise
-    """
-    # Normalize the title for comparison (case insensitive)
-    normalized_title = title.lower().strip()
-    
-    # Extract the core task name without date indicators and common phrases
-    core_title = normalized_title
-    date_indicators = ["tomorrow", "today", "next week", "next month", "on monday", "on tuesday", 
-                      "on wednesday", "on thursday", "on friday", "on saturday", "on sunday"]
-    common_phrases = ["i have", "i need to", "remind me to", "i want to", "i should", "i must"]
-    
-    # Remove date indicators
-    for date_indicator in date_indicators:
-        core_title = core_title.replace(date_indicator, "").strip()
-    
-    # Remove common phrases
-    for phrase in common_phrases:
-        if core_title.startswith(phrase):
-            core_title = core_title[len(phrase):].strip()
-    
-    # Further normalize by removing articles and prepositions at the beginning
-    for word in ["a ", "an ", "the ", "to ", "for ", "at ", "in ", "on "]:
-        if core_title.startswith(word):
-            core_title = core_title[len(word):].strip()
-    
-    logger.info(f"Checking for duplicate task. Original: '{title}', Normalized: '{core_title}'")
-    
-    # Get all todos
-    todos = db.query(Todo).all()
-    
-    # If due_date is provided, parse it
-    parsed_due_date = None
-    if due_date:
-        try:
-            parsed_due_date = datetime.fromisoformat(due_date.replace('Z', '+00:00')).date()
-        except Exception as e:
-            logger.error(f"Error parsing due date: {str(e)}")
-    
-    # Check each todo for similarity
-    for todo in todos:
-        # Normalize todo title
-        todo_title = todo.todo.lower().strip()
-        
-        # Extract core todo title without date indicators and common phrases
-        core_todo_title = todo_title
-        
-        # Remove date indicators
-        for date_indicator in date_indicators:
-            core_todo_title = core_todo_title.replace(date_indicator, "").strip()
-        
-        # Remove common phrases
-        for phrase in common_phrases:
-            if core_todo_title.startswith(phrase):
-                core_todo_title = core_todo_title[len(phrase):].strip()
-        
-        # Further normalize by removing articles and prepositions at the beginning
-        for word in ["a ", "an ", "the ", "to ", "for ", "at ", "in ", "on "]:
-            if core_todo_title.startswith(word):
-                core_todo_title = core_todo_title[len(word):].strip()
-        
-        logger.info(f"Comparing with existing task. Original: '{todo.todo}', Normalized: '{core_todo_title}'")
-        
-        # Compare normalized titles
-        # Use a more flexible matching approach - check if one is contained in the other
-        # or if they're very similar (e.g., "meeting" and "meeting with team")
-        if (core_todo_title in core_title or core_title in core_todo_title or
-            core_todo_title.split()[0] == core_title.split()[0]):  # Compare first words
-            
-            logger.info(f"Potential duplicate found: '{todo.todo}' vs '{title}'")
-            
-            # If no due date is specified for either task, consider it a duplicate
-            if not due_date or not todo.due_date:
-                logger.info(f"Duplicate confirmed (no due date): '{todo.todo}' vs '{title}'")
-                return True
-                
-            # If due dates match, it's a duplicate
-            elif todo.due_date and parsed_due_date and todo.due_date.date() == parsed_due_date:
-                logger.info(f"Duplicate confirmed (matching due dates): '{todo.todo}' vs '{title}'")
-                return True
-                
-            # If the existing task has no due date but we're adding one, consider it a duplicate
-            # and update the existing task with the due date
-            elif not todo.due_date and parsed_due_date:
-                # Update the existing task with the due date
-                todo.due_date = parsed_due_date
-                db.commit()
-                logger.info(f"Updated existing task with due date: '{todo.todo}' -> {parsed_due_date}")
-                return True
-    
-    return False
+    ))
+    return result.scalars().all()
 
-def delete_todo_by_name(db: Session, task_name: str) -> Tuple[bool, int]:
+async def delete_todo_by_name(db: AsyncSession, task_name: str) -> Tuple[bool, int]:
     """
     Delete a todo by name.
     
@@ -250,22 +281,22 @@ def delete_todo_by_name(db: Session, task_name: str) -> Tuple[bool, int]:
         and count is the number of tasks deleted
     """
     try:
-        # Find todos matching the name
+        # Delete all todos matching the name in one statement
         search_term = f"%{task_name}%"
-        todos = db.query(Todo).filter(Todo.todo.ilike(search_term)).all()
+        result = await db.execute(
+            delete(Todo)
+            .where(Todo.todo.ilike(search_term))
+            .execution_options(synchronize_session=False)
+        )
+        count = result.rowcount
         
-        if not todos:
+        if not count:
+            await db.rollback()
             return False, 0
         
-        # Delete all matching todos
-        count = 0
-        for todo in todos:
-            db.delete(todo)
-            count += 1
-        
-        db.commit()
+        await db.commit()
         return True, count
     except Exception as e:
         logger.error(f"Error deleting todo by name: {str(e)}")
-        db.rollback()
+        await db.rollback()
         return False, 0
@@ -1,24 +1,36 @@
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
+from googleapiclient.discovery import build_from_document
+from google_auth_httplib2 import AuthorizedHttp
+from functools import lru_cache
+from pathlib import Path
+import httplib2
 import os.path
-import pickle
 import logging
+import requests
+import threading
+import time
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 SCOPES = ['https://www.googleapis.com/auth/calendar']
-TOKEN_PATH = 'token.pickle'
+TOKEN_PATH = 'token.json'
 CREDENTIALS_PATH = 'client_secret_7820419231-09jjarcsdkp3vprgfkhu1emerf0haiqt.apps.googleusercontent.com.json'
+DISCOVERY_URL = 'https://www.googleapis.com/discovery/v1/apis/calendar/v3/rest'
+DISCOVERY_CACHE_PATH = Path('.cache') / 'calendar_v3.json'
+DISCOVERY_CACHE_TTL = 30 * 24 * 60 * 60  # 30 days
 
-def get_calendar_service():
+# httplib2.Http is not thread-safe, so each worker thread keeps its own
+# service and keep-alive connection to www.googleapis.com
+_thread_local = threading.local()
+
+def get_credentials():
     creds = None
     if os.path.exists(TOKEN_PATH):
-        with open(TOKEN_PATH, 'rb') as token:
-            creds = pickle.load(token)
+        creds = Credentials.from_authorized_user_file(TOKEN_PATH, SCOPES)
     
     if not creds or not creds.valid:
         if creds and creds.expired and creds.refresh_token:
@@ -46,11 +58,39 @@ def get_calendar_service():
                 raise Exception(f"Failed to authenticate with Google Calendar: {str(e)}")
         
         # Save the credentials for future use
-        with open(TOKEN_PATH, 'wb') as token:
-            pickle.dump(creds, token)
-            logger.info("Credentials saved successfully")
+        Path(TOKEN_PATH).write_text(creds.to_json())
+        logger.info("Credentials saved successfully")
+
+    return creds
+
+@lru_cache(maxsize=1)
+def get_discovery_document():
+    # Reuse the on-disk copy until it is older than the TTL
+    try:
+        if time.time() - DISCOVERY_CACHE_PATH.stat().st_mtime < DISCOVERY_CACHE_TTL:
+            return DISCOVERY_CACHE_PATH.read_text()
+    except OSError:
+        pass
+
+    logger.info(f"Fetching Calendar discovery document from {DISCOVERY_URL}")
+    response = requests.get(DISCOVERY_URL, timeout=10)
+    response.raise_for_status()
+    try:
+        DISCOVERY_CACHE_PATH.parent.mkdir(exist_ok=True)
+        DISCOVERY_CACHE_PATH.write_text(response.text)
+    except OSError as e:
+        logger.warning(f"Failed to cache discovery document: {str(e)}")
+    return response.text
 
-    return build('calendar', 'v3', credentials=creds)
+def get_calendar_service():
+    service = getattr(_thread_local, 'service', None)
+    if service is None:
+        # AuthorizedHttp refreshes the token itself, so the service can be
+        # reused for the lifetime of the thread
+        http = AuthorizedHttp(get_credentials(), http=httplib2.Http())
+        service = build_from_document(get_discovery_document(), http=http)
+        _thread_local.service = service
+    return service
 
 def create_calendar_event(title: str, due_date: str):
     try:
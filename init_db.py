@@ -0,0 +1,22 @@
+"""
+Create the database tables for the Speech-To-Plan Reminder application.
+"""
+
+import asyncio
+import logging
+
+from app.models.todo import engine, create_tables
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+async def init_db():
+    """Create the todos table together with its dedupe indexes."""
+    await create_tables()
+    await engine.dispose()
+
+if __name__ == "__main__":
+    logger.info("Creating database tables...")
+    asyncio.run(init_db())
+    logger.info("Database tables created")
@@ -2,6 +2,7 @@
 Main entry point for the Speech-To-Plan Reminder application.
 """
 
+import asyncio
 import uvicorn
 import logging
 from sqladmin import Admin, ModelView
@@ -12,7 +13,8 @@ logger = logging.getLogger(__name__)
 
 # Import app and models
 from app import app
-from app.models.todo import Todo, engine
+from app.config import WORKERS
+from app.models.todo import Todo, engine, create_tables
 
 # Create TodoAdmin view
 class TodoAdmin(ModelView, model=Todo):
@@ -31,6 +33,15 @@ class TodoAdmin(ModelView, model=Todo):
 admin = Admin(app, engine)
 admin.add_view(TodoAdmin)
 
+async def prepare_database():
+    """Create database tables once, before any worker starts."""
+    await create_tables()
+    # Pooled connections belong to this event loop, not the workers' loops
+    await engine.dispose()
+
 if __name__ == "__main__":
+    asyncio.run(prepare_database())
     logger.info("Starting server...")
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # httptools parser; "auto" picks uvloop where installed (it is not available on Windows).
+    # Workers need an import string so each process builds its own app and model.
+    uvicorn.run("main:app", host="0.0.0.0", port=8000, workers=WORKERS, loop="auto", http="httptools")
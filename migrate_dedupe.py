@@ -0,0 +1,91 @@
+"""
+Add the todo dedupe indexes to an existing Speech-To-Plan Reminder database.
+
+Databases created before the todos_dedupe_* unique indexes existed may hold
+duplicate todos, which would make creating the indexes fail. This one-off
+migration merges each group of duplicates into its oldest todo, then creates
+the indexes and checks that repeated upserts still find them. Running it
+again is a no-op.
+"""
+
+import asyncio
+import logging
+from datetime import datetime
+
+from sqlalchemy import delete, func, select, text, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app.models.todo import engine, Todo, todo_title_key, todo_due_day, DEDUPE_INDEXES, dedupe_conflict_target
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+async def merge_duplicates(conn) -> int:
+    """Fold duplicate todos into the oldest one of each group and return how many were removed."""
+    window = {"partition_by": (todo_title_key, todo_due_day), "order_by": Todo.id}
+    ranked = select(
+        Todo.id,
+        Todo.calendar_event_id,
+        func.first_value(Todo.id).over(**window).label("keep_id"),
+        func.row_number().over(**window).label("position"),
+    ).subquery("ranked")
+    
+    # Keep a duplicate's calendar event if the surviving todo has none
+    event_ids = (
+        select(ranked.c.keep_id, func.min(ranked.c.calendar_event_id).label("calendar_event_id"))
+        .where(ranked.c.position > 1, ranked.c.calendar_event_id.isnot(None))
+        .group_by(ranked.c.keep_id)
+        .subquery("event_ids")
+    )
+    await conn.execute(
+        update(Todo.__table__)
+        .where(Todo.id == event_ids.c.keep_id, Todo.calendar_event_id.is_(None))
+        .values(calendar_event_id=event_ids.c.calendar_event_id)
+    )
+    
+    result = await conn.execute(
+        delete(Todo.__table__).where(Todo.id.in_(select(ranked.c.id).where(ranked.c.position > 1)))
+    )
+    return result.rowcount
+
+async def check_upserts(conn, runs: int = 8):
+    """
+    Run the todo upsert repeatedly on one connection and roll it back.
+    
+    asyncpg prepares each statement and Postgres switches to a generic plan
+    after five executions, so this catches conflict targets that stop
+    matching the dedupe indexes once their expressions become parameters.
+    """
+    savepoint = await conn.begin_nested()
+    for due_date in (None, datetime(2000, 1, 1)):
+        for _ in range(runs):
+            insert_stmt = pg_insert(Todo.__table__).values(todo="migrate_dedupe check", due_date=due_date)
+            await conn.execute(
+                insert_stmt.on_conflict_do_update(
+                    set_={"due_date": insert_stmt.excluded.due_date},
+                    **dedupe_conflict_target(due_date is not None),
+                )
+            )
+    await savepoint.rollback()
+    logger.info(f"Ran {runs} upserts per dedupe index without errors")
+
+async def migrate():
+    """Merge duplicate todos and create the dedupe indexes in one transaction."""
+    async with engine.begin() as conn:
+        # Block writes until the indexes exist, so no new duplicate slips in
+        await conn.execute(text(f"LOCK TABLE {Todo.__tablename__} IN SHARE ROW EXCLUSIVE MODE"))
+        
+        removed = await merge_duplicates(conn)
+        logger.info(f"Merged {removed} duplicate todos")
+        
+        for index in DEDUPE_INDEXES:
+            await conn.run_sync(index.create, checkfirst=True)
+        
+        await check_upserts(conn)
+    await engine.dispose()
+
+if __name__ == "__main__":
+    logger.info("Migrating todo dedupe indexes...")
+    asyncio.run(migrate())
+    logger.info("Todo dedupe indexes ready")
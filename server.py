@@ -1,29 +1,37 @@
+import io
 import os
-import json
+import orjson
+import queue
+import threading
+import time
 import torch
 import logging
+import av
 import whisper
-import soundfile as sf
+from whisper.audio import mel_filters, N_FFT, HOP_LENGTH, N_SAMPLES
+from silero_vad import load_silero_vad, get_speech_timestamps
 import numpy as np
-from typing import Optional, Dict, Any
+from numba import njit
+from collections import deque
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Optional, Dict, Any, Iterator, AsyncIterator, Union, BinaryIO
 from fastapi import FastAPI, HTTPException, File, UploadFile, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse, HTMLResponse
+from fastapi.responses import HTMLResponse, ORJSONResponse, StreamingResponse
 from pydantic import BaseModel
-from tempfile import gettempdir
 import uvicorn
 import google.generativeai as genai
+from cachetools import TTLCache
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 from database import SessionLocal, Todo, Base
 from sqlalchemy.orm import Session
-from sqlalchemy import or_
-import base64
-import shutil
-import time
+from sqlalchemy import or_, select, delete, lambda_stmt
+import pybase64
 import asyncio
-import aiofiles
+from concurrent.futures import ThreadPoolExecutor
 from calendar_service import create_calendar_event
 from sqladmin import Admin, ModelView
 from database import engine, Todo
@@ -35,17 +43,112 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Constants
-TEMP_DIR = os.path.join(gettempdir(), 'audio_transcription')
+DATA_URL_MARKER = b'base64,'
 DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
-GEMINI_TEMP_DIR = os.path.join(gettempdir(), "speech_to_plan")
-FFMPEG_PATH = os.path.join(os.path.dirname(__file__), "ffmpeg", "ffmpeg.exe")
-os.makedirs(TEMP_DIR, exist_ok=True)
-os.makedirs(GEMINI_TEMP_DIR, exist_ok=True)
-
-# Load Whisper model
-logger.info(f"Loading Whisper model on {DEVICE}...")
-model = whisper.load_model("base")
-model.to(DEVICE)
+CHUNK_BATCH_SIZE = 8  # 30-second chunks decoded per model call
+WHISPER_CONCURRENCY = int(os.getenv("WHISPER_CONCURRENCY", "2"))  # concurrent whole-file transcriptions
+# Server workers; each process loads its own model. Workers on a GPU would
+# all share one device, so CUDA defaults to a single worker.
+WORKERS = int(os.getenv("WORKERS", "1" if DEVICE == "cuda" else str(max(1, (os.cpu_count() or 2) // 2))))
+# The inductor backend behind torch.compile is not available on Windows
+COMPILE_ENCODER = DEVICE == "cuda" and os.name != "nt"
+
+@lru_cache(maxsize=1)
+def get_model() -> whisper.Whisper:
+    """Load the Whisper model once per process and return the resident copy."""
+    logger.info(f"Loading Whisper model on {DEVICE}...")
+    model = whisper.load_model("base")
+    model.to(DEVICE)
+    model.eval()
+    
+    # Dynamic int8 quantization of the linear layers speeds up CPU inference.
+    # Whisper's Linear subclass only adds dtype casting for fp16, so it is
+    # swapped for plain nn.Linear, which quantize_dynamic knows how to convert.
+    if DEVICE == "cpu":
+        # Split the cores between worker processes instead of oversubscribing them
+        torch.set_num_threads(max(1, (os.cpu_count() or 1) // WORKERS))
+        for module in model.modules():
+            if isinstance(module, whisper.model.Linear):
+                module.__class__ = torch.nn.Linear
+        model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+        logger.info("Quantized Whisper linear layers to int8")
+    
+    # On CUDA, compile the encoder: its input is always a (batch, n_mels, 3000)
+    # mel, so reduce-overhead mode can replay it as a CUDA graph. Batches are
+    # kept to sizes 1 and CHUNK_BATCH_SIZE so only those two graphs exist.
+    if COMPILE_ENCODER:
+        model.encoder = torch.compile(model.encoder, mode="reduce-overhead", fullgraph=True)
+        logger.info("Compiled Whisper encoder")
+    
+    return model
+
+# Silero VAD, used to drop silence before it reaches Whisper. The model keeps
+# streaming state between windows, so calls are serialized.
+get_vad_model = lru_cache(maxsize=1)(load_silero_vad)
+vad_lock = threading.Lock()
+
+def keep_speech(audio: np.ndarray) -> Optional[np.ndarray]:
+    """Return only the speech regions of 16kHz audio, or None if there is no speech."""
+    with vad_lock:
+        spans = get_speech_timestamps(torch.from_numpy(audio), get_vad_model(), sampling_rate=16000)
+    if not spans:
+        return None
+    if len(spans) == 1:
+        return audio[spans[0]['start']:spans[0]['end']]
+    return np.concatenate([audio[span['start']:span['end']] for span in spans])
+
+# Each inference thread issues its kernels on its own CUDA stream
+stream_local = threading.local()
+
+@contextmanager
+def infer_ctx():
+    """Run inference without autograd, on a per-thread CUDA stream when available."""
+    with torch.inference_mode():
+        if DEVICE != "cuda":
+            yield
+            return
+        stream = getattr(stream_local, "stream", None)
+        if stream is None:
+            stream = stream_local.stream = torch.cuda.Stream()
+        with torch.cuda.stream(stream):
+            yield
+        torch.cuda.current_stream().wait_stream(stream)
+
+def to_device(audio: np.ndarray) -> torch.Tensor:
+    """Move audio to DEVICE, staging through pinned memory on CUDA."""
+    tensor = torch.from_numpy(audio)
+    if DEVICE == "cuda":
+        pinned = torch.empty(tensor.shape, dtype=tensor.dtype, pin_memory=True)
+        pinned.copy_(tensor)
+        return pinned.to(DEVICE, non_blocking=True)
+    return tensor
+
+@lru_cache(maxsize=1)
+def get_hann_window() -> torch.Tensor:
+    """STFT window built on DEVICE once instead of on every spectrogram."""
+    return torch.hann_window(N_FFT, device=DEVICE)
+
+def compute_mel(audio: torch.Tensor, n_mels: int) -> torch.Tensor:
+    """Log-mel spectrogram as whisper.log_mel_spectrogram computes it.
+    
+    The window and filterbank are cached on DEVICE, and the 8 dB dynamic
+    range clamp is applied per clip, so batched clips do not affect each other.
+    """
+    stft = torch.stft(audio, N_FFT, HOP_LENGTH, window=get_hann_window(), return_complex=True)
+    magnitudes = stft[..., :-1].abs() ** 2
+    mel = mel_filters(audio.device, n_mels) @ magnitudes
+    log_spec = torch.clamp(mel, min=1e-10).log10()
+    log_spec = torch.maximum(log_spec, log_spec.amax(dim=(-2, -1), keepdim=True) - 8.0)
+    return (log_spec + 4.0) / 4.0
+
+def run_whisper(audio: np.ndarray, **options) -> Dict[str, Any]:
+    """Transcribe audio with the resident Whisper model inside infer_ctx.
+    
+    Decoding runs in fp16 on CUDA and fp32 on CPU unless fp16 is given.
+    """
+    options.setdefault("fp16", DEVICE == "cuda")
+    with infer_ctx():
+        return get_model().transcribe(to_device(audio), **options)
 
 # Configure Gemini
 api_key = os.getenv("GOOGLE_API_KEY")
@@ -99,13 +202,17 @@ System: { "observation": null }
 Assistant: { "type": "output", "output": "I've removed 'Buy groceries' from your todo list" }
 """
 
-# Initialize chat
-chat = gemini_model.start_chat(history=[
+# Initial chat history; each message starts a fresh chat from it
+CHAT_HISTORY = [
     {"role": "user", "parts": [SYSTEM_PROMPT]},
-])
+]
+
+# Gemini's JSON for read-only messages, keyed by normalized message text.
+# Only the intent is cached; todos are still read from the database each time.
+INTENT_CACHE = TTLCache(maxsize=512, ttl=30)
 
 # Create FastAPI app
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONResponse)
 
 # Create SQLAdmin
 class TodoAdmin(ModelView, model=Todo):
@@ -137,10 +244,20 @@ app.add_middleware(
 extension_dir = os.path.join(os.path.dirname(__file__), "extension")
 app.mount("/static", StaticFiles(directory=extension_dir), name="static")
 
+# Read popup.html once; it is static for the lifetime of the server
+try:
+    with open(os.path.join(extension_dir, "popup.html"), "rb") as f:
+        POPUP_HTML = f.read()
+except FileNotFoundError:
+    logger.warning(f"popup.html not found in {extension_dir}")
+    POPUP_HTML = None
+
 @app.get("/")
 async def root():
     """Serve the main popup.html from extension directory"""
-    return FileResponse(os.path.join(extension_dir, "popup.html"))
+    if POPUP_HTML is None:
+        raise HTTPException(status_code=404, detail="popup.html not found")
+    return HTMLResponse(content=POPUP_HTML)
 
 class AudioData(BaseModel):
     audio: str
@@ -153,147 +270,358 @@ class TranscriptionResponse(BaseModel):
 class Message(BaseModel):
     text: str
 
-def save_audio_file(audio_data: str) -> Optional[str]:
-    """Save base64 audio data to a temporary file."""
+def decode_audio_data(audio_data: str) -> Optional[bytes]:
+    """Decode base64 audio data, with or without a data URL prefix."""
     try:
-        # Remove data URL prefix if present
-        if 'base64,' in audio_data:
-            audio_data = audio_data.split('base64,')[1]
+        # Remove data URL prefix if present, slicing a view instead of
+        # copying the payload; the prefix is always near the start
+        buf = audio_data.encode('ascii')
+        prefix_end = buf.find(DATA_URL_MARKER, 0, 256)
+        payload = memoryview(buf)
+        if prefix_end >= 0:
+            payload = payload[prefix_end + len(DATA_URL_MARKER):]
 
         # Decode base64 data
-        audio_bytes = base64.b64decode(audio_data)
-
-        # Create temporary file
-        temp_path = os.path.join(TEMP_DIR, f'temp_audio_{os.urandom(8).hex()}.mp3')
-        
-        with open(temp_path, 'wb') as f:
-            f.write(audio_bytes)
-        
-        return temp_path
+        return pybase64.b64decode(payload, validate=False)
     except Exception as e:
-        logger.error(f"Error saving audio file: {str(e)}")
+        logger.error(f"Error decoding audio data: {str(e)}")
         return None
 
-def load_audio(file_path: str) -> Optional[np.ndarray]:
-    """Load audio file and return numpy array."""
-    try:
-        # Convert audio to WAV format with required specifications
-        output_path = file_path.rsplit('.', 1)[0] + '_converted.wav'
-        
-        # FFmpeg command to convert audio to the required format
-        command = [
-            FFMPEG_PATH,
-            '-i', file_path,
-            '-ar', '16000',  # Sample rate: 16kHz
-            '-ac', '1',      # Mono channel
-            '-c:a', 'pcm_f32le',  # 32-bit float
-            '-f', 'wav',
-            '-y',  # Overwrite output file if it exists
-            output_path
-        ]
-        
-        logger.debug(f"Running FFmpeg command: {' '.join(command)}")
-        
-        # Run ffmpeg command
-        process = subprocess.run(
-            command,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            check=True  # Raise exception if command fails
-        )
-        
-        logger.debug(f"FFmpeg output: {process.stderr.decode()}")
-            
-        # Read the converted WAV file using soundfile
-        audio, sr = sf.read(output_path, dtype='float32')
-        logger.debug(f"Loaded audio with sample rate: {sr}Hz")
-            
-        # Normalize audio if it's not already normalized
-        max_abs = np.max(np.abs(audio))
-        logger.debug(f"Original audio range: [{np.min(audio)}, {np.max(audio)}], max abs: {max_abs}")
-        
-        if max_abs > 1.0:
-            audio = audio / max_abs
-        elif max_abs < 1e-3:  # If the audio is too quiet
-            logger.warning("Audio signal is very weak, amplifying...")
-            audio = audio * (0.5 / max_abs)  # Amplify to 50% of full scale
-            
-        logger.info(f"Successfully loaded audio: shape={audio.shape}, dtype={audio.dtype}, range=[{np.min(audio)}, {np.max(audio)}]")
+# Fast-math flags without nnan/ninf, so the finiteness check stays valid
+@njit(cache=True, fastmath={'reassoc', 'contract', 'arcp'})
+def audio_stats(audio: np.ndarray):
+    """Return (min, max, max abs, sum of squares, all finite) in one pass."""
+    audio_min = np.inf
+    audio_max = -np.inf
+    sum_squares = 0.0
+    finite = True
+    for x in audio:
+        if not np.isfinite(x):
+            finite = False
+            continue
+        if x < audio_min:
+            audio_min = x
+        if x > audio_max:
+            audio_max = x
+        sum_squares += x * x
+    max_abs = max(abs(audio_min), abs(audio_max))
+    return audio_min, audio_max, max_abs, sum_squares, finite
+
+def decode_pcm(source) -> Iterator[np.ndarray]:
+    """Decode audio in-process with PyAV, yielding 16kHz mono float32 blocks."""
+    with av.open(source) as container:
+        stream = container.streams.audio[0]
+        # libswresample handles the downmix, resampling and sample format at once
+        resampler = av.AudioResampler(format='flt', layout='mono', rate=16000)
+        for frame in container.decode(stream):
+            for resampled in resampler.resample(frame):
+                yield resampled.to_ndarray().reshape(-1)
+        # Flush samples buffered inside the resampler
+        for resampled in resampler.resample(None):
+            yield resampled.to_ndarray().reshape(-1)
+
+def normalize_audio(audio: np.ndarray) -> Optional[np.ndarray]:
+    """Normalize writable audio in place; return None if invalid or silent."""
+    # Gather all statistics in a single pass over the samples
+    audio_min, audio_max, max_abs, sum_squares, finite = audio_stats(audio)
+    if not finite:
+        logger.error("Audio contains invalid values")
+        return None
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"Original audio range: [{audio_min}, {audio_max}], max abs: {max_abs}")
+    
+    # Normalize audio if it's not already normalized
+    scale = 1.0
+    if max_abs > 1.0:
+        scale = 1.0 / max_abs
+    elif 0.0 < max_abs < 1e-3:  # If the audio is too quiet
+        logger.warning("Audio signal is very weak, amplifying...")
+        scale = 0.5 / max_abs  # Amplify to 50% of full scale
+    if scale != 1.0:
+        np.multiply(audio, np.float32(scale), out=audio)
         
-        # Check for silence or very low volume
-        rms = np.sqrt(np.mean(np.square(audio)))
+    logger.info(f"Successfully loaded audio: shape={audio.shape}, dtype={audio.dtype}, range=[{audio_min * scale}, {audio_max * scale}]")
+    
+    # Check for silence or very low volume
+    rms = np.sqrt(sum_squares / audio.size) * scale
+    if logger.isEnabledFor(logging.DEBUG):
         logger.debug(f"Audio RMS value: {rms}")
+    
+    if rms < 1e-4:
+        logger.warning("Audio appears to be silent or very quiet")
+        return None
+    
+    return audio
+
+def load_audio(source: Union[bytes, BinaryIO]) -> Optional[np.ndarray]:
+    """Decode audio bytes or a binary file object and return numpy array."""
+    try:
+        if isinstance(source, (bytes, bytearray)):
+            source = io.BytesIO(source)
+        blocks = list(decode_pcm(source))
+        if not blocks:
+            return np.empty(0, dtype=np.float32)
         
-        if rms < 1e-4:
-            logger.warning("Audio appears to be silent or very quiet")
-            return None
-        
-        # Clean up converted file
-        try:
-            os.remove(output_path)
-        except Exception as e:
-            logger.warning(f"Failed to remove temporary file {output_path}: {e}")
-        
-        return audio
+        # The concatenated array is freshly allocated, so it can be normalized in place
+        return normalize_audio(np.concatenate(blocks))
         
-    except subprocess.CalledProcessError as e:
-        logger.error(f"FFmpeg error: {e.stderr.decode()}")
-        return None
     except Exception as e:
         logger.error(f"Error loading audio: {str(e)}")
         return None
 
-def process_audio_in_chunks(audio: np.ndarray, chunk_duration: int = 30, overlap: int = 1) -> str:
-    """Process long audio files in chunks."""
+# Pool of reusable PCM chunk buffers; each 30-second chunk is ~2 MB, which
+# would otherwise be a fresh mmap/munmap per chunk under sustained load
+BUF_POOL = queue.LifoQueue(maxsize=2 * CHUNK_BATCH_SIZE)
+
+def get_buf(size: int) -> bytearray:
+    """Take a buffer of at least size bytes from the pool, or allocate one."""
+    try:
+        buf = BUF_POOL.get_nowait()
+        if len(buf) >= size:
+            return buf
+    except queue.Empty:
+        pass
+    return bytearray(size)
+
+def return_buf(buf: bytearray):
+    """Give a buffer back to the pool once nothing references its contents."""
+    try:
+        BUF_POOL.put_nowait(buf)
+    except queue.Full:
+        pass
+
+def stream_audio_chunks(audio_bytes: bytes, chunk_duration: int = 30, overlap: int = 1):
+    """Decode audio with PyAV, yielding overlapping chunks as soon as they are decoded.
+    
+    Yields (audio, buf) pairs; audio is a view over buf, a pooled buffer the
+    caller hands back with return_buf when done with the chunk.
+    """
     sample_rate = 16000
     chunk_size = chunk_duration * sample_rate
     overlap_size = overlap * sample_rate
     
-    # Calculate number of chunks
-    total_samples = len(audio)
-    num_chunks = (total_samples - overlap_size) // (chunk_size - overlap_size) + 1
-    
-    logger.info(f"Processing audio in {num_chunks} chunks")
-    
-    transcriptions = []
-    start_idx = 0
-    
-    for i in range(num_chunks):
-        end_idx = min(start_idx + chunk_size, total_samples)
-        chunk = audio[start_idx:end_idx]
+    blocks = decode_pcm(io.BytesIO(audio_bytes))
+    block = np.empty(0, dtype=np.float32)
+    tail = block
+    first = True
+    while True:
+        buf = get_buf(chunk_size * 4)  # float32 samples
+        chunk = np.frombuffer(buf, dtype=np.float32, count=chunk_size)
+        chunk[:len(tail)] = tail
+        filled = len(tail)
         
-        # Skip chunks that are too short
-        if len(chunk) < sample_rate:  # Skip chunks shorter than 1 second
-            logger.warning(f"Skipping chunk {i+1} as it's too short")
-            continue
-            
-        logger.info(f"Processing chunk {i+1}/{num_chunks}")
+        # Copy decoded blocks straight into the pooled buffer until it is full
+        while filled < chunk_size:
+            if not block.size:
+                block = next(blocks, None)
+                if block is None:
+                    block = np.empty(0, dtype=np.float32)
+                    break
+            take = min(chunk_size - filled, block.size)
+            chunk[filled:filled + take] = block[:take]
+            block = block[take:]
+            filled += take
+        
+        if filled == len(tail) and not first:
+            return_buf(buf)
+            break
+        at_end = filled < chunk_size
+        tail = chunk[max(filled - overlap_size, 0):filled].copy()
+        
+        # Skip trailing chunks shorter than 1 second
+        if first or filled >= sample_rate:
+            yield chunk[:filled], buf
+        else:
+            return_buf(buf)
+        first = False
+        if at_end:
+            break
+
+# Dynamic batcher: chunks from concurrent requests that arrive within
+# BATCH_WINDOW of each other share one batched decode on the model
+BATCH_WINDOW = 0.02  # seconds
+batch_queue: Optional[asyncio.Queue] = None
+whisper_semaphore: Optional[asyncio.Semaphore] = None
+
+def submit_chunk(chunk: np.ndarray, buf: bytearray) -> asyncio.Future:
+    """Queue a chunk for the batch worker; the future resolves to its text."""
+    future = asyncio.get_running_loop().create_future()
+    batch_queue.put_nowait((chunk, buf, future))
+    return future
+
+async def batch_worker():
+    """Collect queued chunks into batches and decode each batch in one model call."""
+    loop = asyncio.get_running_loop()
+    while True:
+        batch = [await batch_queue.get()]
+        deadline = loop.time() + BATCH_WINDOW
+        while len(batch) < CHUNK_BATCH_SIZE:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(batch_queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
         
+        logger.info(f"Decoding batch of {len(batch)} chunks")
         try:
-            # Convert to torch tensor
-            audio_tensor = torch.from_numpy(chunk).to(DEVICE)
-            
-            # Transcribe chunk
-            result = model.transcribe(
-                audio_tensor,
-                fp16=False,
-                language='en'
-            )
-            
-            transcription = result["text"].strip()
-            if transcription:  # Only add non-empty transcriptions
-                transcriptions.append(transcription)
-                
-            logger.info(f"Chunk {i+1} transcription: {transcription}")
-            
+            texts = await asyncio.to_thread(decode_chunks, [chunk for chunk, _, _ in batch])
         except Exception as e:
-            logger.error(f"Error processing chunk {i+1}: {str(e)}")
-            continue
-            
-        # Update start index for next chunk, accounting for overlap
-        start_idx = end_idx - overlap_size
-        
-    return " ".join(transcriptions)
+            logger.error(f"Error decoding batch: {str(e)}")
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        else:
+            for (_, _, future), text in zip(batch, texts):
+                if not future.done():
+                    future.set_result(text)
+        finally:
+            for _, buf, _ in batch:
+                return_buf(buf)
+
+@app.on_event("startup")
+async def start_batch_worker():
+    """Create the batch queue and Whisper semaphore on the server's event loop and start the worker."""
+    global batch_queue, whisper_semaphore
+    batch_queue = asyncio.Queue()
+    whisper_semaphore = asyncio.Semaphore(WHISPER_CONCURRENCY)
+    asyncio.create_task(batch_worker())
+
+async def iter_transcription(audio_bytes: bytes) -> AsyncIterator[str]:
+    """Transcribe audio while it is still being decoded, yielding chunk texts in order.
+    
+    Chunks are queued as PyAV produces them, so decoding overlaps with
+    inference, and are decoded by the batch worker together with chunks
+    from other requests. Yields nothing if no usable audio was decoded.
+    """
+    loop = asyncio.get_running_loop()
+    ready = asyncio.Queue()
+    
+    def produce():
+        try:
+            for chunk, buf in stream_audio_chunks(audio_bytes):
+                chunk = normalize_audio(chunk) if chunk.size else None
+                if chunk is not None:
+                    chunk = keep_speech(chunk)
+                if chunk is None:
+                    return_buf(buf)
+                else:
+                    loop.call_soon_threadsafe(ready.put_nowait, (chunk, buf))
+        finally:
+            loop.call_soon_threadsafe(ready.put_nowait, None)
+    
+    producer = loop.run_in_executor(None, produce)
+    futures = deque()
+    
+    try:
+        while True:
+            item = await ready.get()
+            if item is None:
+                break
+            # The batch worker returns the buffer to the pool once decoded
+            futures.append(submit_chunk(*item))
+            # Emit chunks that are already decoded without waiting for the rest
+            while futures and futures[0].done():
+                yield futures.popleft().result()
+    finally:
+        # Surface decoding failures raised in the producer
+        await producer
+    
+    while futures:
+        yield await futures.popleft()
+
+async def transcribe_stream(audio_bytes: bytes) -> Optional[str]:
+    """Transcribe audio while it is still being decoded.
+    
+    Returns None if no usable audio was decoded.
+    """
+    transcriptions = [text async for text in iter_transcription(audio_bytes)]
+    if not transcriptions:
+        return None
+    return " ".join(text for text in transcriptions if text)
+
+def sse_event(data: Dict[str, Any]) -> bytes:
+    """Encode a server-sent event carrying a JSON payload."""
+    return b"data: " + orjson.dumps(data) + b"\n\n"
+
+async def transcription_events(audio_bytes: bytes) -> AsyncIterator[bytes]:
+    """Stream each chunk's transcription, then the chat reply, as server-sent events.
+    
+    The final event mirrors TranscriptionResponse, or carries success=False
+    and a detail message if transcription failed.
+    """
+    chunk_count = 0
+    transcriptions = []
+    try:
+        async for text in iter_transcription(audio_bytes):
+            yield sse_event({"chunk": chunk_count, "text": text})
+            chunk_count += 1
+            if text:
+                transcriptions.append(text)
+    except av.error.FFmpegError as e:
+        logger.error(f"Error decoding audio: {str(e)}")
+        chunk_count = 0
+    except Exception as e:
+        logger.error(f"Error during transcription: {str(e)}")
+        yield sse_event({"success": False, "detail": f"Transcription error: {str(e)}"})
+        return
+    
+    if not chunk_count:
+        yield sse_event({"success": False, "detail": "Failed to load audio file or audio is silent"})
+        return
+    
+    transcription = " ".join(transcriptions)
+    logger.info(f"Transcription result: '{transcription}'")
+    if not transcription:
+        yield sse_event({"success": True, "transcription": "No speech detected in the audio."})
+        return
+    
+    # The request's dependencies are finalized once the response starts,
+    # so the stream opens its own session for the chat step
+    db = SessionLocal()
+    try:
+        chat_response = await process_chat_message(transcription, db)
+    finally:
+        db.close()
+    yield sse_event({"success": True, "transcription": transcription, "chat_response": chat_response["reply"]})
+
+def decode_chunks(chunks: list) -> list:
+    """Decode up to 30-second chunks as one batch, returning their texts."""
+    model = get_model()
+    options = whisper.DecodingOptions(language='en', fp16=(DEVICE == "cuda"), without_timestamps=True)
+    
+    # Pad every chunk to 30 s straight into one (pinned, on CUDA) staging
+    # batch, instead of padding, stacking and then staging separate copies.
+    # The compiled encoder always gets full batches: silent rows fill partial
+    # ones, so its captured graph is replayed instead of recompiled per size.
+    rows = max(len(chunks), CHUNK_BATCH_SIZE) if COMPILE_ENCODER else len(chunks)
+    batch = torch.zeros((rows, N_SAMPLES), dtype=torch.float32, pin_memory=(DEVICE == "cuda"))
+    for row, chunk in zip(batch, chunks):
+        chunk = chunk[:N_SAMPLES]
+        row[:len(chunk)] = torch.from_numpy(chunk)
+    with infer_ctx():
+        # Compute all log-mel spectrograms at once on DEVICE
+        mels = compute_mel(batch.to(DEVICE, non_blocking=True), model.dims.n_mels)
+        results = whisper.decode(model, mels, options)
+    return [result.text.strip() for result in results[:len(chunks)]]
+
+def warmup_whisper():
+    """Run dummy inputs through both transcription paths to warm the model."""
+    start = time.perf_counter()
+    # Load the VAD and cache the mel filterbank on DEVICE
+    get_vad_model()
+    mel_filters(DEVICE, get_model().dims.n_mels)
+    silence = np.zeros(16000, dtype=np.float32)
+    run_whisper(silence, language='en')
+    # A full batch, the only size the compiled encoder sees from the batch worker
+    decode_chunks([silence] * CHUNK_BATCH_SIZE)
+    logger.info(f"Whisper model warmed up in {time.perf_counter() - start:.2f}s")
+
+@app.on_event("startup")
+async def warmup_model():
+    """Warm up Whisper before serving so the first request avoids kernel selection."""
+    await asyncio.to_thread(warmup_whisper)
 
 # Dependency to get the database session
 def get_db():
@@ -305,20 +633,37 @@ def get_db():
 
 async def process_chat_message(message: str, db: Session):
     try:
-        # Send message to Gemini
-        logger.info(f"Sending message to Gemini: {message}")
-        response = chat.send_message(message)
-        response_text = response.text
-        logger.info(f"Raw Gemini response: {response_text}")
-        
-        # Simple approach: Just extract the JSON part from the markdown code block
-        if "```json" in response_text and "```" in response_text:
-            # Get the content between ```json and the last ```
-            json_text = response_text.split("```json")[1].split("```")[0].strip()
-            logger.info(f"Extracted JSON text: {json_text}")
+        # Repeated read-only questions reuse Gemini's earlier reply
+        cache_key = " ".join(message.lower().split())
+        json_text = INTENT_CACHE.get(cache_key)
+        if json_text is None:
+            # Send message to Gemini without blocking the event loop, so the batch
+            # worker keeps decoding other requests' audio during the round trip
+            logger.info(f"Sending message to Gemini: {message}")
+            # A request-scoped chat keeps concurrent users' turns apart and
+            # keeps the prompt from growing with every message ever sent
+            chat = gemini_model.start_chat(history=CHAT_HISTORY)
+            response = await chat.send_message_async(message)
+            response_text = response.text
+            logger.info(f"Raw Gemini response: {response_text}")
             
+            # Simple approach: Just extract the JSON part from the markdown code block,
+            # locating both fences with find() instead of splitting the whole text
+            fence_start = response_text.find("```json")
+            if fence_start != -1:
+                # Get the content between ```json and the closing ```
+                body_start = fence_start + len("```json")
+                fence_end = response_text.find("```", body_start)
+                json_text = response_text[body_start:fence_end if fence_end != -1 else None].strip()
+                logger.info(f"Extracted JSON text: {json_text}")
+        else:
+            logger.info(f"Using cached Gemini reply for: {message}")
+        
+        if json_text is not None:
             try:
-                response_json = json.loads(json_text)
+                response_json = orjson.loads(json_text)
+                if response_json.get("function") == "getAllTodos":
+                    INTENT_CACHE[cache_key] = json_text
                 
                 # If it's a direct output response, return it immediately
                 if "type" in response_json and response_json["type"] == "output":
@@ -326,8 +671,6 @@ async def process_chat_message(message: str, db: Session):
                 
                 # Handle action responses
                 if "type" in response_json and response_json["type"] == "action":
-                    observation = None
-                    
                     if response_json["function"] == "createTodo":
                         input_data = response_json["input"]
                         title = input_data.get("title", "")
@@ -357,28 +700,29 @@ async def process_chat_message(message: str, db: Session):
                         return {"reply": f"Added '{title}' to your todo list"}
                     
                     elif response_json["function"] == "getAllTodos":
-                        todos = db.query(Todo).all()
-                        if todos:
-                            todo_list = "\n".join([
-                                f"- {todo.todo} (Due: {todo.due_date.strftime('%Y-%m-%d') if todo.due_date else 'No due date'})"
-                                for todo in todos
-                            ])
+                        # Load only the needed columns as plain rows, skipping ORM hydration;
+                        # lambda_stmt caches the statement so it is not rebuilt per request
+                        rows = db.execute(lambda_stmt(lambda: select(Todo.todo, Todo.due_date))).all()
+                        if rows:
+                            todo_list = "\n".join(
+                                f"- {title} (Due: {due_date:%Y-%m-%d})" if due_date else f"- {title} (Due: No due date)"
+                                for title, due_date in rows
+                            )
                             return {"reply": f"Here are all your todos:\n{todo_list}"}
                         else:
                             return {"reply": "You don't have any todos yet"}
                     
                     elif response_json["function"] == "searchTodo":
                         search_term = response_json["input"]["title"]
-                        todos = db.query(Todo).filter(
-                            Todo.todo.ilike(f"%{search_term}%")
-                        ).all()
+                        pattern = f"%{search_term}%"
+                        # Delete the matching todos and collect their titles in one statement
+                        deleted_titles = db.execute(
+                            lambda_stmt(lambda: delete(Todo).where(Todo.todo.ilike(pattern)).returning(Todo.todo)),
+                            execution_options={"synchronize_session": False}
+                        ).scalars().all()
+                        db.commit()
                         
-                        if todos:
-                            # First, let's delete the matching todo
-                            for todo in todos:
-                                db.delete(todo)
-                            db.commit()
-                            deleted_titles = [todo.todo for todo in todos]
+                        if deleted_titles:
                             return {"reply": f"Deleted the following todos:\n" + "\n".join([f"- {title}" for title in deleted_titles])}
                         else:
                             return {"reply": f"I couldn't find any todos matching '{search_term}'"}
@@ -386,26 +730,26 @@ async def process_chat_message(message: str, db: Session):
                     elif response_json["function"] == "deleteTodoById":
                         todo_id = response_json["input"]
                         if isinstance(todo_id, list):
-                            # Handle bulk deletion
-                            success_count = 0
-                            for tid in todo_id:
-                                todo = db.query(Todo).filter(Todo.id == tid).first()
-                                if todo:
-                                    db.delete(todo)
-                                    success_count += 1
+                            # Handle bulk deletion with a single DELETE ... WHERE id IN (...)
+                            result = db.execute(
+                                lambda_stmt(lambda: delete(Todo).where(Todo.id.in_(todo_id))),
+                                execution_options={"synchronize_session": False}
+                            )
                             db.commit()
-                            return {"reply": f"Successfully deleted {success_count} todos"}
+                            return {"reply": f"Successfully deleted {result.rowcount} todos"}
                         else:
                             # Handle single deletion
-                            todo = db.query(Todo).filter(Todo.id == todo_id).first()
-                            if todo:
-                                db.delete(todo)
-                                db.commit()
+                            result = db.execute(
+                                lambda_stmt(lambda: delete(Todo).where(Todo.id == todo_id)),
+                                execution_options={"synchronize_session": False}
+                            )
+                            db.commit()
+                            if result.rowcount:
                                 return {"reply": f"Successfully deleted todo"}
                             else:
                                 return {"reply": "Could not find the todo to delete"}
-            except json.JSONDecodeError as e:
-                logger.error(f"Failed to parse Gemini response as JSON: {response_text}")
+            except orjson.JSONDecodeError as e:
+                logger.error(f"Failed to parse Gemini response as JSON: {json_text}")
                 return {"reply": "I apologize, but I couldn't understand how to process that. Could you please try:\n1. Using simpler phrases\n2. Breaking down your request\n3. Speaking more clearly"}
         
         # If we get here, we couldn't extract JSON from the response
@@ -416,253 +760,122 @@ async def process_chat_message(message: str, db: Session):
         return {"reply": "I encountered an error while processing your request. Could you please try again or rephrase your request?"}
 
 @app.post("/transcribe", response_model=TranscriptionResponse)
-async def transcribe_audio(audio_data: AudioData) -> TranscriptionResponse:
-    """Transcribe audio data."""
-    audio_path = None
+async def transcribe_audio(audio_data: AudioData, stream: bool = False, db: Session = Depends(get_db)):
+    """Transcribe audio data.
+    
+    With ?stream=true, chunk transcriptions and the chat reply are sent
+    as server-sent events as soon as each is ready.
+    """
     try:
         if not audio_data.audio:
             raise HTTPException(status_code=400, detail="No audio data received")
 
-        audio_path = save_audio_file(audio_data.audio)
-        if not audio_path:
-            raise HTTPException(status_code=500, detail="Failed to save audio file")
+        audio_bytes = decode_audio_data(audio_data.audio)
+        if not audio_bytes:
+            raise HTTPException(status_code=400, detail="Failed to decode audio data")
 
-        try:
-            file_size = os.path.getsize(audio_path)
-            logger.info(f"Processing file: {audio_path} (Size: {file_size} bytes)")
-
-            logger.info("Loading audio file...")
-            audio = load_audio(audio_path)
-            if audio is None:
-                raise HTTPException(status_code=500, detail="Failed to load audio file or audio is silent")
+        logger.info(f"Processing audio ({len(audio_bytes)} bytes)")
 
-            if len(audio) == 0:
-                raise HTTPException(status_code=400, detail="Audio file is empty")
+        if stream:
+            return StreamingResponse(transcription_events(audio_bytes), media_type="text/event-stream")
 
-            if not np.isfinite(audio).all():
-                raise HTTPException(status_code=400, detail="Audio contains invalid values")
+        try:
+            # Decode and transcribe concurrently; long audio is chunked as it streams in
+            transcription = await transcribe_stream(audio_bytes)
+        except av.error.FFmpegError as e:
+            logger.error(f"Error decoding audio: {str(e)}")
+            transcription = None
+        if transcription is None:
+            raise HTTPException(status_code=500, detail="Failed to load audio file or audio is silent")
 
-            # Process audio based on its length
-            duration = len(audio) / 16000  # Calculate duration in seconds
-            logger.info(f"Audio duration: {duration:.1f} seconds")
+        try:
+            logger.info(f"Transcription result: '{transcription}'")
 
-            try:
-                if duration > 30:  # For files longer than 30 seconds
-                    logger.info("Long audio detected, processing in chunks...")
-                    transcription = process_audio_in_chunks(audio)
-                else:
-                    # Convert to torch tensor for short files
-                    audio_tensor = torch.from_numpy(audio).to(DEVICE)
-                    result = model.transcribe(
-                        audio_tensor,
-                        fp16=False,
-                        language='en'
-                    )
-                    transcription = result["text"].strip()
-
-                logger.info(f"Transcription result: '{transcription}'")
-
-                if not transcription:
-                    return TranscriptionResponse(
-                        success=True,
-                        transcription="No speech detected in the audio."
-                    )
-
-                # Process transcribed text with Gemini
-                chat_response = await process_chat_message(transcription, db=get_db())
-                
+            if not transcription:
                 return TranscriptionResponse(
                     success=True,
-                    transcription=transcription,
-                    chat_response=chat_response["reply"]
+                    transcription="No speech detected in the audio."
                 )
 
-            except Exception as e:
-                logger.error(f"Error during transcription: {str(e)}")
-                raise HTTPException(
-                    status_code=500,
-                    detail=f"Transcription error: {str(e)}"
-                )
+            # Process transcribed text with Gemini
+            chat_response = await process_chat_message(transcription, db)
+            
+            return TranscriptionResponse(
+                success=True,
+                transcription=transcription,
+                chat_response=chat_response["reply"]
+            )
 
-        finally:
-            # Delete the temporary audio file
-            if audio_path and os.path.exists(audio_path):
-                try:
-                    os.remove(audio_path)
-                    logger.info(f"Deleted temporary audio file: {audio_path}")
-                except Exception as e:
-                    logger.warning(f"Failed to delete temporary file {audio_path}: {e}")
+        except Exception as e:
+            logger.error(f"Error during transcription: {str(e)}")
+            raise HTTPException(
+                status_code=500,
+                detail=f"Transcription error: {str(e)}"
+            )
 
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Server error: {str(e)}", exc_info=True)
-        if audio_path and os.path.exists(audio_path):
-            try:
-                os.remove(audio_path)
-                logger.info(f"Deleted temporary audio file: {audio_path}")
-            except Exception as e:
-                logger.warning(f"Failed to delete temporary file {audio_path}: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# Dedicated pool for decoding uploads, so decoding the next request overlaps
+# with inference on the current one and never waits behind other executor work
+decoder_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="decoder")
+
 @app.post("/transcribe_gemini")
 async def transcribe_audio_gemini(
     audio: UploadFile = File(..., description="The audio file to transcribe"),
     db: Session = Depends(get_db)
 ):
-    audio_path = None
-    wav_path = None
     try:
-        # Create temporary directory if it doesn't exist
-        os.makedirs(GEMINI_TEMP_DIR, exist_ok=True)
-        
-        # Generate a unique filename with timestamp
-        timestamp = int(time.time())
-        temp_filename = f"audio_{timestamp}.webm"  
-        audio_path = os.path.join(GEMINI_TEMP_DIR, temp_filename)
-        wav_path = os.path.join(GEMINI_TEMP_DIR, f"audio_{timestamp}.wav")
-        
-        logger.info(f"Processing audio file:")
-        logger.info(f"Input path: {audio_path}")
-        logger.info(f"Output path: {wav_path}")
-        logger.info(f"FFmpeg path: {FFMPEG_PATH}")
+        logger.info(f"Processing uploaded audio: {audio.filename}")
         
-        # Save uploaded file
-        contents = await audio.read()
-        async with aiofiles.open(audio_path, 'wb') as out_file:
-            await out_file.write(contents)
+        # Decode straight from the upload's spooled file with PyAV on the decoder
+        # pool, without first copying the whole body into a bytes object
+        audio_data = await asyncio.get_running_loop().run_in_executor(decoder_pool, load_audio, audio.file)
+        if audio_data is None:
+            raise HTTPException(status_code=500, detail="Failed to load audio file or audio is silent")
+        if audio_data.size == 0:
+            raise HTTPException(status_code=400, detail="Audio file is empty")
         
-        logger.info(f"Audio file saved ({len(contents)} bytes)")
+        logger.info(f"Audio data shape: {audio_data.shape}")
         
-        if not os.path.exists(audio_path):
-            raise HTTPException(
-                status_code=500,
-                detail=f"Failed to save audio file at {audio_path}"
-            )
-        
-        # Convert WebM to WAV using ffmpeg
-        logger.info("Starting FFmpeg conversion...")
-        process = await asyncio.create_subprocess_exec(
-            FFMPEG_PATH, '-i', audio_path, '-ar', '16000', '-ac', '1', '-c:a', 'pcm_s16le', wav_path,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE
-        )
-        stdout, stderr = await process.communicate()
-        
-        if process.returncode != 0:
-            error_msg = stderr.decode() if stderr else "Unknown FFmpeg error"
-            logger.error(f"FFmpeg error: {error_msg}")
-            raise HTTPException(status_code=500, detail=f"Error converting audio format: {error_msg}")
-        
-        if not os.path.exists(wav_path):
+        # Transcribe audio
+        logger.info("Starting Whisper transcription...")
+        try:
+            # Transcribe off the event loop, bounding concurrent jobs on the device
+            async with whisper_semaphore:
+                result = await asyncio.to_thread(run_whisper, audio_data)
+            logger.info("Transcription completed")
+        except Exception as transcribe_error:
+            logger.error(f"Error during transcription: {transcribe_error}")
             raise HTTPException(
                 status_code=500,
-                detail=f"FFmpeg failed to create output file at {wav_path}"
+                detail=f"Error during transcription: {str(transcribe_error)}"
             )
         
-        logger.info("FFmpeg conversion successful")
+        transcribed_text = result["text"].strip()
+        logger.info(f"Transcribed text: {transcribed_text}")
         
-        # Load and transcribe audio
-        logger.info("Starting Whisper transcription...")
-        
-        if not os.path.exists(wav_path):
+        if not transcribed_text:
             raise HTTPException(
-                status_code=500,
-                detail=f"WAV file not found at {wav_path} before Whisper processing"
+                status_code=400, 
+                detail="Could not transcribe audio - no speech detected"
             )
             
-        # Get file size and verify file
-        file_size = os.path.getsize(wav_path)
-        logger.info(f"WAV file size: {file_size} bytes")
-        logger.info(f"WAV file absolute path: {os.path.abspath(wav_path)}")
+        # Process transcribed text with Gemini
+        logger.info("Processing with Gemini...")
+        chat_response = await process_chat_message(transcribed_text, db)
         
-        try:
-            # Read the audio file directly using soundfile first to verify it
-            try:
-                import soundfile as sf
-                audio_data, sample_rate = sf.read(wav_path)
-                logger.info(f"Audio file info: {sf.info(wav_path)}")
-                logger.info(f"Audio data shape from soundfile: {audio_data.shape}")
-                logger.info(f"Sample rate: {sample_rate}")
-                
-                # Convert to float32 and normalize if needed
-                audio_data = audio_data.astype(np.float32)
-                if audio_data.max() > 1.0:
-                    audio_data = audio_data / 32768.0  # Normalize 16-bit audio
-                
-                logger.info(f"Audio data type: {audio_data.dtype}")
-                logger.info(f"Audio data min/max: {np.min(audio_data)}/{np.max(audio_data)}")
-                
-                # Try transcribing with the loaded audio data
-                try:
-                    result = model.transcribe(audio_data)
-                    logger.info("Transcription completed")
-                except Exception as transcribe_error:
-                    logger.error(f"Error during transcription: {transcribe_error}")
-                    raise HTTPException(
-                        status_code=500,
-                        detail=f"Error during transcription: {str(transcribe_error)}"
-                    )
-                
-            except Exception as sf_error:
-                logger.error(f"Error reading WAV file with soundfile: {sf_error}")
-                raise HTTPException(
-                    status_code=500,
-                    detail=f"Invalid WAV file: {str(sf_error)}"
-                )
-            
-            transcribed_text = result["text"].strip()
-            logger.info(f"Transcribed text: {transcribed_text}")
-            
-            if not transcribed_text:
-                raise HTTPException(
-                    status_code=400, 
-                    detail="Could not transcribe audio - no speech detected"
-                )
-                
-            # Process transcribed text with Gemini
-            logger.info("Processing with Gemini...")
-            chat_response = await process_chat_message(transcribed_text, db)
-            
-            response_data = {
-                "success": True,
-                "transcription": transcribed_text,
-                "chat_response": chat_response["reply"]
-            }
-            
-            # Clean up files only after successful processing
-            try:
-                if audio_path and os.path.exists(audio_path):
-                    os.remove(audio_path)
-                    logger.info(f"Cleaned up input file: {audio_path}")
-                if wav_path and os.path.exists(wav_path):
-                    os.remove(wav_path)
-                    logger.info(f"Cleaned up output file: {wav_path}")
-            except Exception as e:
-                logger.warning(f"Error cleaning up temporary files: {str(e)}")
-            
-            return response_data
-            
-        except Exception as e:
-            logger.error(f"Whisper error: {str(e)}")
-            logger.error(f"Whisper error type: {type(e)}")
-            raise HTTPException(
-                status_code=500,
-                detail=f"Error during transcription: {str(e)}"
-            )
+        return {
+            "success": True,
+            "transcription": transcribed_text,
+            "chat_response": chat_response["reply"]
+        }
             
     except Exception as e:
         logger.error(f"Error in transcribe_audio_gemini: {str(e)}")
-        # Clean up files in case of error
-        try:
-            if audio_path and os.path.exists(audio_path):
-                os.remove(audio_path)
-                logger.info(f"Cleaned up input file after error: {audio_path}")
-            if wav_path and os.path.exists(wav_path):
-                os.remove(wav_path)
-                logger.info(f"Cleaned up output file after error: {wav_path}")
-        except Exception as cleanup_error:
-            logger.warning(f"Error cleaning up temporary files after error: {cleanup_error}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/chat", response_model=dict)
@@ -678,101 +891,13 @@ async def chat_endpoint(message: Message, db: Session = Depends(get_db)):
         logger.error(f"Error in chat endpoint: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error processing message: {str(e)}")
 
-@app.post("/transcribe", response_model=TranscriptionResponse)
-async def transcribe_audio(audio_data: AudioData) -> TranscriptionResponse:
-    """Transcribe audio data."""
-    audio_path = None
-    try:
-        if not audio_data.audio:
-            raise HTTPException(status_code=400, detail="No audio data received")
-
-        audio_path = save_audio_file(audio_data.audio)
-        if not audio_path:
-            raise HTTPException(status_code=500, detail="Failed to save audio file")
-
-        try:
-            file_size = os.path.getsize(audio_path)
-            logger.info(f"Processing file: {audio_path} (Size: {file_size} bytes)")
-
-            logger.info("Loading audio file...")
-            audio = load_audio(audio_path)
-            if audio is None:
-                raise HTTPException(status_code=500, detail="Failed to load audio file or audio is silent")
-
-            if len(audio) == 0:
-                raise HTTPException(status_code=400, detail="Audio file is empty")
-
-            if not np.isfinite(audio).all():
-                raise HTTPException(status_code=400, detail="Audio contains invalid values")
-
-            # Process audio based on its length
-            duration = len(audio) / 16000  # Calculate duration in seconds
-            logger.info(f"Audio duration: {duration:.1f} seconds")
-
-            try:
-                if duration > 30:  # For files longer than 30 seconds
-                    logger.info("Long audio detected, processing in chunks...")
-                    transcription = process_audio_in_chunks(audio)
-                else:
-                    # Convert to torch tensor for short files
-                    audio_tensor = torch.from_numpy(audio).to(DEVICE)
-                    result = model.transcribe(
-                        audio_tensor,
-                        fp16=False,
-                        language='en'
-                    )
-                    transcription = result["text"].strip()
-
-                logger.info(f"Transcription result: '{transcription}'")
-
-                if not transcription:
-                    return TranscriptionResponse(
-                        success=True,
-                        transcription="No speech detected in the audio."
-                    )
-
-                # Process transcribed text with Gemini
-                chat_response = await process_chat_message(transcription, db=get_db())
-                
-                return TranscriptionResponse(
-                    success=True,
-                    transcription=transcription,
-                    chat_response=chat_response["reply"]
-                )
-
-            except Exception as e:
-                logger.error(f"Error during transcription: {str(e)}")
-                raise HTTPException(
-                    status_code=500,
-                    detail=f"Transcription error: {str(e)}"
-                )
-
-        finally:
-            # Delete the temporary audio file
-            if audio_path and os.path.exists(audio_path):
-                try:
-                    os.remove(audio_path)
-                    logger.info(f"Deleted temporary audio file: {audio_path}")
-                except Exception as e:
-                    logger.warning(f"Failed to delete temporary file {audio_path}: {e}")
-
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"Server error: {str(e)}", exc_info=True)
-        if audio_path and os.path.exists(audio_path):
-            try:
-                os.remove(audio_path)
-                logger.info(f"Deleted temporary audio file: {audio_path}")
-            except Exception as e:
-                logger.warning(f"Failed to delete temporary file {audio_path}: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
-
 @app.get("/todos")
 async def get_todos(db: Session = Depends(get_db)):
-    todos = db.query(Todo).all()
-    return [{"id": todo.id, "title": todo.todo, "due_date": todo.due_date.isoformat() if todo.due_date else None} for todo in todos]
+    rows = db.execute(lambda_stmt(lambda: select(Todo.id, Todo.todo, Todo.due_date))).all()
+    return [{"id": todo_id, "title": title, "due_date": due_date.isoformat() if due_date else None} for todo_id, title, due_date in rows]
 
 if __name__ == "__main__":
     logger.info("Starting server...")
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # httptools parser; "auto" picks uvloop where installed (it is not available on Windows).
+    # Workers need an import string so each process builds its own app and model.
+    uvicorn.run("server:app", host="0.0.0.0", port=8000, workers=WORKERS, loop="auto", http="httptools")